@@ -1,9 +1,17 @@
+from collections import Counter
+
 import streamlit as st
-from ultralytics import YOLO
 import numpy as np
-import cv2
-from PIL import Image
-import os
+
+from batching import chunked, count_images, decode_image, expand_uploads
+from box_renderer import BoxRenderer
+from checkpoint_meta import is_corrupted_name
+from detector_registry import FRUIT_NAMES
+from image_io import decode_upload, upload_buffer
+from instrumentation import show_trace, start_request
+from previews import download_full, preview_bytes, show_preview
+from result_cache import cached_detect, cached_detect_batch, digest_bytes
+from warmup import mark, show_readiness, start_warmup, wait_ready
 
 # ----------------------------
 # 🎨 Page Configuration & UI Aesthetics
@@ -70,144 +78,195 @@ st.markdown('<p class="sub-title">Scientific Magnification & Box Detection Syste
 # ----------------------------
 # 📦 Model Loading
 # ----------------------------
-# Mapping for fixed fruit names (Forced override for corrupted model metadata)
-FRUIT_NAMES = {
-    0: "Banana",
-    1: "Pineapple",
-    2: "Apple",
-    3: "Orange",
-    4: "Mango",
-    5: "Grapes",
-    6: "Strawberry",
-    7: "Watermelon"
+# The registry applies FRUIT_NAMES (fixed names for corrupted model metadata)
+# on its own copy of the model and shares it with the other apps.  It loads
+# and warms up in the background while the page is already usable.
+start_warmup(["fruit"], imgsz=640)
+show_readiness(["fruit"])
+
+# Colors for different classes to match the "Look" the user wants
+# Using high-contrast premium colors
+CLASS_COLORS = {
+    0: (255, 100, 0),   # Banana (Blue-ish/Orange Mix)
+    1: (255, 255, 0),   # Pineapple (Cyan)
+    2: (0, 0, 255),     # Apple (Red)
+    3: (0, 165, 255),   # Orange (Orange Color)
+    4: (0, 255, 255),   # Mango (Yellow)
+    5: (255, 0, 255),   # Grapes (Pink/Purple)
 }
+DEFAULT_COLOR = (0, 255, 0) # Green for others
+
+
+def fruit_colors(cls_id, label):
+    return CLASS_COLORS.get(cls_id, DEFAULT_COLOR), (0, 0, 0)
+
+
+# Label tags plus up to 4 magnification zoom windows
+renderer = BoxRenderer(
+    names=FRUIT_NAMES,
+    colors=fruit_colors,
+    label_format="{label} {pct}%",
+    default_label="Fruit {}",
+    insets=4,
+)
 
-@st.cache_resource
-def load_fruit_model():
-    path = "fruit_best.pt" if os.path.exists("fruit_best.pt") else "yolov11n.pt"
-    model = YOLO(path)
-    
-    # Aggressively override model.names to ensure internal consistency
-    for idx, name in FRUIT_NAMES.items():
-        model.names[idx] = name
-        
-    return model
 
-with st.spinner("🚀 Initializing AI Vision..."):
-    model = load_fruit_model()
+def annotate_fruits(img_bgr, dets):
+    """Draw boxes, label tags and zoom insets for already-thresholded detections.
+
+    Draws on ``img_bgr`` in place (zoom crops are taken first) and returns it
+    with the detected labels.
+    """
+    labels = dets.labels(FRUIT_NAMES, "Fruit {}")
+    # Skip if the label is accidentally the metadata string (protection)
+    valid = np.array([not is_corrupted_name(lbl) for lbl in labels], dtype=bool)
+    dets = dets.select(valid)
+    labels = [lbl for lbl, ok in zip(labels, valid) if ok]
+    return renderer.render(img_bgr, dets, out=img_bgr), labels
+
+
+mode = st.radio("Scan mode", ["Single image", "Batch (crate)"], horizontal=True)
 
 # ----------------------------
-# 📂 Image Upload & Processing
+# 📦 Batch Scan (many photos or a zip)
 # ----------------------------
-col1, col2 = st.columns([1, 1], gap="large")
-
-with col1:
-    st.markdown("### 📤 Step 1: Upload Fruit Image")
-    uploaded_file = st.file_uploader(
-        "Supported formats: JPG, JPEG, PNG",
-        type=["jpg", "jpeg", "png"],
+if mode == "Batch (crate)":
+    st.markdown("### 📤 Upload a crate of photos")
+    batch_files = st.file_uploader(
+        "Supported formats: JPG, JPEG, PNG or a ZIP of images",
+        type=["jpg", "jpeg", "png", "zip"],
+        accept_multiple_files=True,
         label_visibility="collapsed"
     )
-    
-    conf_threshold = st.slider("Select Confidence Threshold", 0.05, 1.0, 0.25, 0.05)
-    
-    if uploaded_file:
-        input_image = Image.open(uploaded_file).convert("RGB")
-        st.markdown('<div class="result-container">', unsafe_allow_html=True)
-        st.image(input_image, caption="Original Image", use_container_width=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        detect_btn = st.button("🔍 START SCAN")
-
-with col2:
-    st.markdown("### 🎯 Step 2: Detection Result")
-    if uploaded_file and detect_btn:
-        with st.spinner("🧠 Analyzing Fruit Samples..."):
-            # Prepare image
-            img_np = np.array(input_image)
-            img_bgr = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-            
-            # Run inference
-            results = model(img_bgr, conf=conf_threshold, imgsz=640)
-            
-            detections_found = False
-            all_detected_labels = []
-            output_img = img_bgr.copy()
-            detection_count = 0
-            
-            # Colors for different classes to match the "Look" the user wants
-            # Using high-contrast premium colors
-            CLASS_COLORS = {
-                0: (255, 100, 0),   # Banana (Blue-ish/Orange Mix)
-                1: (255, 255, 0),   # Pineapple (Cyan)
-                2: (0, 0, 255),     # Apple (Red)
-                3: (0, 165, 255),   # Orange (Orange Color)
-                4: (0, 255, 255),   # Mango (Yellow)
-                5: (255, 0, 255),   # Grapes (Pink/Purple)
-            }
-            DEFAULT_COLOR = (0, 255, 0) # Green for others
-
-            # Processing results
-            for result in results:
-                for box in result.boxes:
-                    cls_id = int(box.cls[0])
-                    # Use our fixed mapping exclusively to avoid metadata strings
-                    label = FRUIT_NAMES.get(cls_id, f"Fruit {cls_id}")
-                    conf = float(box.conf[0])
-                    
-                    # Skip if the label is accidentally the metadata string (protection)
-                    if "dataset" in label.lower() or "created on" in label.lower():
-                        continue
-
-                    detections_found = True
-                    detection_count += 1
-                    all_detected_labels.append(label)
-                    
-                    # Coordinates
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    
-                    # Style: Box color based on class
-                    color = CLASS_COLORS.get(cls_id, DEFAULT_COLOR)
-                    
-                    # Draw Bounding Box (Scientific Rounded Corners style)
-                    cv2.rectangle(output_img, (x1, y1), (x2, y2), color, 2)
-                    
-                    # Draw Label Tag (Background for readability)
-                    label_txt = f"{label} {int(conf*100)}%"
-                    (tw, th), _ = cv2.getTextSize(label_txt, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                    cv2.rectangle(output_img, (x1, y1 - th - 10), (x1 + tw + 10, y1), color, -1)
-                    cv2.putText(output_img, label_txt, (x1 + 5, y1 - 7), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,0), 2)
-
-                    # Magnification Zoom View (Top layer)
-                    try:
-                        crop = img_bgr[y1:y2, x1:x2]
-                        if crop.size > 0 and detection_count <= 4: # Limit zoom windows to 4
-                            zoom_size = 150
-                            zoom_view = cv2.resize(crop, (zoom_size, zoom_size))
-                            cv2.rectangle(zoom_view, (0, 0), (zoom_size-1, zoom_size-1), color, 3)
-                            
-                            h, w, _ = img_bgr.shape
-                            # Placement logic to avoid overlapping
-                            z_x = w - zoom_size - 20
-                            z_y = 20 + (detection_count-1) * (zoom_size + 20)
-                            
-                            if z_y + zoom_size < h:
-                                output_img[z_y:z_y+zoom_size, z_x:z_x+zoom_size] = zoom_view
-                                cv2.putText(output_img, f"SCAN #{detection_count}", (z_x, z_y - 5), 
-                                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
-                                # Thin line connecting box to zoom
-                                cv2.line(output_img, (x2, y1), (z_x, z_y), color, 1)
-                    except Exception:
-                        pass
-
-            if detections_found:
+
+    b1, b2, b3 = st.columns(3)
+    with b1:
+        conf_threshold = st.slider("Select Confidence Threshold", 0.05, 1.0, 0.25, 0.05)
+    with b2:
+        batch_size = st.slider("Images per model call", 1, 32, 8)
+    with b3:
+        page_size = st.selectbox("Results per page", [6, 12, 24], index=1)
+
+    if batch_files and st.button("🔍 SCAN CRATE"):
+        # One trace for the whole crate; stage times add up over the images
+        trace = start_request("fruit-batch")
+        with st.spinner("🚀 Initializing AI Vision..."), trace.stage("model_wait"):
+            model = wait_ready("fruit")
+        scanned = []
+        total = max(count_images(batch_files), 1)
+        progress = st.progress(0.0, text="🧠 Analyzing crate...")
+        for chunk in chunked(expand_uploads(batch_files), batch_size):
+            with trace.stage("hash"):
+                digests = [digest_bytes(data) for _, data in chunk]
+            with trace.stage("decode"):
+                chunk = [(name, digest, decode_image(data)) for (name, data), digest in zip(chunk, digests)]
+            chunk = [item for item in chunk if item[2] is not None]
+            if not chunk:
+                continue
+            names, digests, images = map(list, zip(*chunk))
+            # One forward pass for the images of this mini-batch not seen before
+            with trace.stage("detect"):
+                raw = cached_detect_batch(model, images, digests, imgsz=640)
+            for name, digest, img, dets in zip(names, digests, images, raw):
+                with trace.stage("draw"):
+                    output_img, labels = annotate_fruits(img, dets.filter(conf_threshold))
+                # Keep only a small encoded preview; full frames are not needed for the grid
+                with trace.stage("thumbnail"):
+                    thumb = preview_bytes(output_img, digest, f"{model.identity}|{conf_threshold}",
+                                          max_side=320)
+                scanned.append({"name": name, "labels": labels, "thumb": thumb})
+            progress.progress(min(len(scanned) / total, 1.0),
+                              text=f"🧠 Analyzed {len(scanned)} / {total} images...")
+        progress.empty()
+        st.session_state["fruit_batch"] = scanned
+        st.session_state["fruit_batch_page"] = 1
+        mark("first_detection")
+        show_trace(trace.finish())
+
+    scanned = st.session_state.get("fruit_batch", [])
+    if scanned:
+        class_counts = Counter(lbl for item in scanned for lbl in item["labels"])
+        empty_images = sum(1 for item in scanned if not item["labels"])
+        st.success(f"✅  Crate Scan Complete! {len(scanned)} images, "
+                   f"{sum(class_counts.values())} fruits identified.")
+
+        st.markdown("### 📊 Per-Class Count")
+        st.table({
+            "Fruit": list(class_counts.keys()) + ["(no fruit found)"],
+            "Count": list(class_counts.values()) + [empty_images],
+        })
+
+        n_pages = (len(scanned) + page_size - 1) // page_size
+        page = st.number_input("Page", 1, n_pages,
+                               min(st.session_state.get("fruit_batch_page", 1), n_pages))
+        st.session_state["fruit_batch_page"] = page
+        start = (page - 1) * page_size
+        grid = st.columns(3)
+        for i, item in enumerate(scanned[start:start + page_size]):
+            with grid[i % 3]:
+                caption = f"{item['name']} · {len(item['labels'])} fruits"
+                st.image(item["thumb"], caption=caption, use_container_width=True)
+    else:
+        st.info("💡 Pro Tip: Drop a whole crate at once — select many photos or upload a single ZIP.")
+
+# ----------------------------
+# 📂 Image Upload & Processing
+# ----------------------------
+else:
+    col1, col2 = st.columns([1, 1], gap="large")
+
+    with col1:
+        st.markdown("### 📤 Step 1: Upload Fruit Image")
+        uploaded_file = st.file_uploader(
+            "Supported formats: JPG, JPEG, PNG",
+            type=["jpg", "jpeg", "png"],
+            label_visibility="collapsed"
+        )
+
+        conf_threshold = st.slider("Select Confidence Threshold", 0.05, 1.0, 0.25, 0.05)
+
+        if uploaded_file:
+            # Timed from decode; recorded only when a result is shown
+            trace = start_request("fruit")
+            # One BGR array, decoded straight from the upload buffer
+            with trace.stage("decode"):
+                img_bgr = decode_upload(uploaded_file)
+            if img_bgr is None:
+                st.error("❌ Unsupported or corrupted image file")
+                st.stop()
+            with trace.stage("hash"):
+                image_digest = digest_bytes(upload_buffer(uploaded_file))
+            st.markdown('<div class="result-container">', unsafe_allow_html=True)
+            # A display-sized JPEG, encoded once per upload
+            with trace.stage("display"):
+                show_preview(st, img_bgr, image_digest, caption="Original Image")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+            if st.button("🔍 START SCAN"):
+                # Remember the scan so slider moves re-filter instead of hiding it
+                st.session_state["fruit_scan"] = image_digest
+
+    with col2:
+        st.markdown("### 🎯 Step 2: Detection Result")
+        if uploaded_file and st.session_state.get("fruit_scan") == image_digest:
+            with st.spinner("🧠 Analyzing Fruit Samples..."):
+                with trace.stage("model_wait"):
+                    model = wait_ready("fruit")
+                # Raw detections are cached; a new threshold only re-filters
+                with trace.stage("detect"):
+                    dets = cached_detect(model, img_bgr, image_digest, imgsz=640)
+                with trace.stage("draw"):
+                    output_img, all_detected_labels = annotate_fruits(img_bgr, dets.filter(conf_threshold))
+
+            if all_detected_labels:
                 st.success(f"✅  Scan Complete! {len(all_detected_labels)} fruits identified.")
-                result_rgb = cv2.cvtColor(output_img, cv2.COLOR_BGR2RGB)
                 st.markdown('<div class="result-container">', unsafe_allow_html=True)
-                st.image(result_rgb, caption="AI Identification & Magnification View", use_container_width=True)
+                with trace.stage("display"):
+                    show_preview(st, output_img, image_digest, f"{model.identity}|{conf_threshold}",
+                                 caption="AI Identification & Magnification View")
                 st.markdown('</div>', unsafe_allow_html=True)
-                
+                download_full(st, output_img, f"fruits_{uploaded_file.name}")
+
                 # Show summary in a nice grid
                 st.markdown("### 📊 Detection Intelligence Summary")
                 cols = st.columns(3)
@@ -216,9 +275,13 @@ with col2:
                         st.info(f"📍 Item {i+1}: **{lbl.upper()}**")
             else:
                 st.warning("⚠️ No fruit samples identified in this scan. Try lowering the confidence threshold.")
-                st.image(input_image, use_container_width=True)
-    else:
-        st.info("💡 Pro Tip: Upload an image of Mixed Fruits (Apple, Banana, Mango) for the best results.")
+                # Nothing was drawn: the original preview again, from the cache
+                with trace.stage("display"):
+                    show_preview(st, img_bgr, image_digest)
+            mark("first_detection")
+            show_trace(trace.finish())
+        else:
+            st.info("💡 Pro Tip: Upload an image of Mixed Fruits (Apple, Banana, Mango) for the best results.")
 
 # ----------------------------
 # 📌 Footer
@@ -228,3 +291,5 @@ st.markdown(
     '<p style="text-align:center; color:#666;">YOLO11 Fruit Intelligence System v3.0 | Optimized for FRUITS DETECTION</p>', 
     unsafe_allow_html=True
 )
+
+mark("interactive")
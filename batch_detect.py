@@ -0,0 +1,344 @@
+"""
+Headless batch detection over directories of images.
+
+    python batch_detect.py photos/ more_photos/ --model fruit --output fruit.jsonl --workers 4
+
+Input directories are walked lazily, file bytes are prefetched on a thread
+pool, and decoding + inference run in ``--workers`` processes, each pinned to
+its own share of the CPU cores.  Results stream out one record per image as
+JSONL, or as Parquet part files when ``--output`` ends in ``.parquet``.
+
+The output doubles as the checkpoint: re-running the same command skips every
+image already written, so a crashed job restarts where it left off.
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from batching import IMAGE_EXTENSIONS, chunked
+from detector_registry import DETECTORS, DetectorSpec, resolve_weights
+
+
+# ---------------------------
+# Input walking
+# ---------------------------
+def iter_images(paths):
+    """Yield image paths under ``paths`` lazily, in a stable (sorted) order."""
+    for path in paths:
+        if os.path.isfile(path):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                yield path
+            continue
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                print(f"skipping {current}: {e}", file=sys.stderr)
+                continue
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+            # Reversed so the stack pops directories in sorted order
+            stack.extend(reversed(subdirs))
+
+
+def prefetch_batches(paths, batch_size, io_pool, ahead):
+    """Batches of ``(path, bytes)``, with the reads of ``ahead`` batches in flight."""
+    pending = deque()
+    for chunk in chunked(paths, batch_size):
+        pending.append([io_pool.submit(read_bytes, path) for path in chunk])
+        if len(pending) > ahead:
+            yield [future.result() for future in pending.popleft()]
+    while pending:
+        yield [future.result() for future in pending.popleft()]
+
+
+def read_bytes(path):
+    try:
+        with open(path, "rb") as f:
+            return path, f.read()
+    except OSError:
+        return path, None
+
+
+# ---------------------------
+# Worker processes
+# ---------------------------
+_worker = {}
+
+
+def split_cores(n_workers):
+    """Split the cores available to this process into ``n_workers`` groups."""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    n_workers = max(1, min(n_workers, len(cores)))
+    share, extra = divmod(len(cores), n_workers)
+    groups, start = [], 0
+    for i in range(n_workers):
+        size = share + (1 if i < extra else 0)
+        groups.append(cores[start:start + size])
+        start += size
+    return groups
+
+
+def _init_worker(spec, core_queue, decode_threads):
+    import torch
+
+    cores = core_queue.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+    from detector_registry import get_registry
+
+    _worker["detector"] = get_registry().load(spec)
+    _worker["decode_pool"] = ThreadPoolExecutor(decode_threads)
+
+
+def _detect_batch(items, conf, imgsz):
+    """Decode and detect one batch of ``(path, bytes)``; returns JSON-ready records."""
+    from batching import decode_image
+    from detections import Detections
+
+    detector = _worker["detector"]
+    names = detector.names
+    images = list(_worker["decode_pool"].map(
+        lambda item: decode_image(item[1]) if item[1] is not None else None, items))
+
+    records, batch, batch_paths = [], [], []
+    for (path, _), img in zip(items, images):
+        if img is None:
+            records.append({"path": path, "error": "unreadable image"})
+        else:
+            batch.append(img)
+            batch_paths.append(path)
+
+    if batch:
+        kwargs = {"conf": conf, "verbose": False}
+        if imgsz:
+            kwargs["imgsz"] = imgsz
+        for path, img, result in zip(batch_paths, batch, detector(batch, **kwargs)):
+            dets = Detections.from_result(result)
+            records.append({
+                "path": path,
+                "width": img.shape[1],
+                "height": img.shape[0],
+                "detections": [
+                    {"cls": c, "label": names.get(c, str(c)), "conf": round(p, 4),
+                     "xyxy": [round(v, 1) for v in box]}
+                    for box, p, c in zip(dets.xyxy.tolist(), dets.conf.tolist(), dets.cls.tolist())
+                ],
+            })
+    return records
+
+
+# ---------------------------
+# Output writers (the output is also the checkpoint)
+# ---------------------------
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+        self._repair_tail()
+        self._f = open(path, "a", encoding="utf-8")
+
+    def _repair_tail(self):
+        # Drop a half-written last line left by a crash
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data_end = f.seek(0, os.SEEK_END)
+            if data_end == 0:
+                return
+            f.seek(max(0, data_end - 1_000_000))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return
+            cut = tail.rfind(b"\n")
+            f.truncate(data_end - len(tail) + cut + 1 if cut >= 0 else 0)
+
+    def rows(self):
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def done_paths(self):
+        return {row["path"] for row in self.rows()}
+
+    def write(self, records):
+        for record in records:
+            self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def truncate(self):
+        self._f.truncate(0)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetWriter:
+    """Writes each flush as an atomically renamed part file in a directory.
+
+    Rows not yet in a part are journaled to ``pending.jsonl`` batch by
+    batch, so a crash loses no more than the JSONL output would; the next
+    run carries them over into its first part.
+    """
+
+    def __init__(self, path, rows_per_part=5000):
+        import pyarrow  # noqa: F401  (fail early if parquet output is unavailable)
+
+        self.path = path
+        self.rows_per_part = rows_per_part
+        os.makedirs(path, exist_ok=True)
+        self._part = len(glob.glob(os.path.join(path, "part-*.parquet")))
+        self._journal = JsonlWriter(os.path.join(path, "pending.jsonl"))
+        # A crash between writing a part and clearing the journal leaves
+        # rows in both; the part wins
+        in_parts = self._part_paths()
+        self._rows = [row for row in self._journal.rows() if row["path"] not in in_parts]
+
+    def _part_paths(self):
+        import pyarrow.parquet as pq
+
+        done = set()
+        for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            done.update(pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return done
+
+    def done_paths(self):
+        return self._part_paths() | {row["path"] for row in self._rows}
+
+    def write(self, records):
+        rows = [{
+            "path": r["path"],
+            "width": r.get("width"),
+            "height": r.get("height"),
+            "error": r.get("error"),
+            "detections": json.dumps(r.get("detections", [])),
+        } for r in records]
+        self._journal.write(rows)
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        target = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(self._rows), target + ".tmp")
+        os.replace(target + ".tmp", target)
+        self._part += 1
+        self._rows = []
+        self._journal.truncate()
+
+    def close(self):
+        self.flush()
+        self._journal.close()
+
+
+def open_writer(path):
+    if path.endswith(".parquet"):
+        return ParquetWriter(path)
+    return JsonlWriter(path)
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+def run(args):
+    if args.weights:
+        spec = DetectorSpec(args.weights, names=DETECTORS[args.model].names)
+    else:
+        spec = DETECTORS[args.model]
+    # Fail here rather than inside every worker
+    resolve_weights(spec)
+
+    writer = open_writer(args.output)
+    done = writer.done_paths() if os.path.exists(args.output) else set()
+    if done:
+        print(f"resuming: {len(done)} images already in {args.output}", file=sys.stderr)
+
+    core_groups = split_cores(args.workers)
+    ctx = multiprocessing.get_context("spawn")
+    core_queue = ctx.Queue()
+    for group in core_groups:
+        core_queue.put(group)
+
+    todo = (p for p in iter_images(args.inputs) if p not in done)
+    processed, started = 0, time.perf_counter()
+    max_in_flight = len(core_groups) * 2
+
+    with ThreadPoolExecutor(args.prefetch_threads) as io_pool, ProcessPoolExecutor(
+        len(core_groups), mp_context=ctx, initializer=_init_worker,
+        initargs=(spec, core_queue, args.decode_threads),
+    ) as procs:
+        # Bytes of the next batches are read on threads while workers decode and infer
+        batches = prefetch_batches(todo, args.batch_size, io_pool, args.prefetch_batches)
+        in_flight = set()
+        try:
+            for batch in batches:
+                in_flight.add(procs.submit(_detect_batch, batch, args.conf, args.imgsz))
+                if len(in_flight) < max_in_flight:
+                    continue
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    records = future.result()
+                    writer.write(records)
+                    processed += len(records)
+                _report(processed, started)
+            for future in in_flight:
+                records = future.result()
+                writer.write(records)
+                processed += len(records)
+        finally:
+            writer.close()
+
+    _report(processed, started, final=True)
+
+
+def _report(processed, started, final=False):
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    end = "\n" if final else "\r"
+    print(f"{processed} images, {rate:.1f} img/s", end=end, file=sys.stderr, flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch object detection over image directories")
+    parser.add_argument("inputs", nargs="+", help="image files or directories (searched recursively)")
+    parser.add_argument("--model", choices=sorted(DETECTORS), default="fruit")
+    parser.add_argument("--weights", help="override the weights file of --model")
+    parser.add_argument("--output", required=True, help=".jsonl file or .parquet directory")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--imgsz", type=int, default=None)
+    parser.add_argument("--prefetch-threads", type=int, default=4)
+    parser.add_argument("--prefetch-batches", type=int, default=4,
+                        help="batches whose files are read ahead of the workers")
+    parser.add_argument("--decode-threads", type=int, default=2)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,91 @@
+"""
+Helpers for running many images through a detector at once.
+
+``expand_uploads`` flattens a mix of uploaded images and zip archives into
+``(name, bytes)`` pairs, ``decode_image`` turns each into a BGR array and
+``chunked`` groups anything into fixed-size mini-batches, so a model is called
+once per batch instead of once per image.
+"""
+
+import io
+import os
+import zipfile
+from itertools import islice
+
+import cv2
+
+from image_io import decode_buffer
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def chunked(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _zip_images(archive):
+    for member in archive.infolist():
+        if member.is_dir() or not is_image_name(member.filename):
+            continue
+        # Skip macOS resource forks shipped inside zips
+        if os.path.basename(member.filename).startswith("._"):
+            continue
+        yield member
+
+
+def count_images(files):
+    """Number of images ``expand_uploads`` will yield, without decoding any."""
+    total = 0
+    for f in files:
+        if f.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(f.getvalue())) as archive:
+                total += sum(1 for _ in _zip_images(archive))
+        elif is_image_name(f.name):
+            total += 1
+    return total
+
+
+def expand_uploads(files):
+    """Yield ``(name, bytes)`` for every image in ``files``.
+
+    ``files`` are Streamlit ``UploadedFile`` objects (or anything with
+    ``name`` and ``getvalue()``).  Zip archives are opened and their image
+    members yielded one by one, so a crate of photos can be uploaded as one
+    archive without extracting it to disk.
+    """
+    for f in files:
+        if f.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(f.getvalue())) as archive:
+                for member in _zip_images(archive):
+                    yield member.filename, archive.read(member)
+        elif is_image_name(f.name):
+            yield f.name, f.getvalue()
+
+
+def decode_image(data):
+    """Decode encoded image bytes into an upright BGR array (``None`` if unreadable)."""
+    return decode_buffer(data)
+
+
+def make_thumbnail(img, max_side=320):
+    """Downscale ``img`` so its longest side is at most ``max_side``."""
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return img
+    size = (int(w * scale), int(h * scale))
+    # INTER_AREA at a fractional ratio is slow on full frames; halve with
+    # the (much cheaper) Gaussian pyramid first while that stays above size
+    while max(img.shape[:2]) >= 2 * max_side:
+        img = cv2.pyrDown(img)
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,232 @@
+"""
+Reproducible latency / throughput benchmark for the four detectors.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --models fruit --imgsz 320 640 --batch 1 8 --threads 1 4 \\
+        --backend pt onnx --samples samples/ --output new.json --compare baseline.json
+
+Detectors are loaded exactly as the apps load them (through the shared
+registry, so fruit gets its ``FRUIT_NAMES`` override and the chosen backend).
+Every configuration in the matrix (model x backend x imgsz x batch x threads x
+image set) runs in a fresh subprocess, so cold-start time and peak RSS are
+measured per configuration.  Image sets are a seeded synthetic set and,
+optionally, a fixed directory of sample photos.
+
+A backend with no accepted artifact for a model's weights (see
+:mod:`export_backends`) is recorded as ``skipped`` instead of silently
+running the ``.pt`` fallback under its name.  ``--threads`` only applies to
+``pt``: ONNX Runtime and OpenVINO size their own thread pools inside
+ultralytics, so their rows run once with ``threads`` set to ``null``.
+
+``--compare`` checks the new results against a baseline JSON and exits with
+status 1 when p50/p95 latency, throughput or peak RSS regress by more than
+``--tolerance``.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+SYNTHETIC_SHAPES = ((480, 640), (1080, 1920))
+SYNTHETIC_SEED = 1234
+
+
+# ---------------------------
+# Worker (one configuration per process)
+# ---------------------------
+def load_image_set(image_set, limit=32):
+    import numpy as np
+
+    if image_set == "synthetic":
+        rng = np.random.default_rng(SYNTHETIC_SEED)
+        return [rng.integers(0, 256, (*SYNTHETIC_SHAPES[i % len(SYNTHETIC_SHAPES)], 3), dtype=np.uint8)
+                for i in range(8)]
+    from export_backends import load_samples
+
+    return load_samples(image_set, limit=limit)
+
+
+def run_config(config):
+    """Benchmark one configuration in this process; returns a result dict."""
+    import numpy as np
+    import resource
+    import torch
+
+    if config["threads"] is not None:
+        torch.set_num_threads(config["threads"])
+
+    from detector_registry import get_registry
+
+    images = load_image_set(config["image_set"])
+    if not images:
+        raise FileNotFoundError(f"No images in image set '{config['image_set']}'")
+
+    detector = get_registry().load(config["model"], config["backend"])
+    if config["backend"] != "pt" and detector.path.endswith(".pt"):
+        raise RuntimeError(f"{config['backend']} fell back to {detector.path}")
+    kwargs = {"conf": 0.25, "imgsz": config["imgsz"], "verbose": False}
+    # The same deterministic sequence of batches for every run
+    stream = itertools.cycle(images)
+    batches = [list(itertools.islice(stream, config["batch"]))
+               for _ in range(config["warmup"] + config["iterations"])]
+
+    detector(batches[0], **kwargs)
+    cold_start = time.time() - config["spawned_at"]
+
+    for batch in batches[1:config["warmup"]]:
+        detector(batch, **kwargs)
+
+    latencies = []
+    started = time.perf_counter()
+    for batch in batches[config["warmup"]:]:
+        t0 = time.perf_counter()
+        detector(batch, **kwargs)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    per_image_ms = np.array(latencies) * 1000 / config["batch"]
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 2**20 if sys.platform == "darwin" else rss / 1024
+    return dict(
+        config,
+        artifact=os.path.basename(detector.path),
+        cold_start_s=round(cold_start, 3),
+        p50_ms=round(float(np.percentile(per_image_ms, 50)), 2),
+        p95_ms=round(float(np.percentile(per_image_ms, 95)), 2),
+        p99_ms=round(float(np.percentile(per_image_ms, 99)), 2),
+        images_per_s=round(config["iterations"] * config["batch"] / elapsed, 2),
+        peak_rss_mb=round(rss_mb, 1),
+    )
+
+
+# ---------------------------
+# Orchestration
+# ---------------------------
+def config_key(result):
+    return "|".join(str(result[k]) for k in ("model", "backend", "imgsz", "batch", "threads", "image_set"))
+
+
+def spawn(config):
+    config = dict(config, spawned_at=time.time())
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(config)],
+        capture_output=True, text=True,
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        err = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return dict(config, error=err)
+    return json.loads(lines[-1])
+
+
+def environment():
+    info = {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count()}
+    for module in ("torch", "ultralytics", "onnxruntime", "openvino"):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                        capture_output=True, text=True).stdout.strip()
+    except OSError:
+        pass
+    return info
+
+
+def compare(results, baseline, tolerance):
+    """Rows of ``(key, metric, base, new)`` that regressed past ``tolerance``."""
+    base = {config_key(r): r for r in baseline["results"] if "error" not in r and "skipped" not in r}
+    regressions = []
+    for r in results:
+        if "error" in r or "skipped" in r or config_key(r) not in base:
+            continue
+        b = base[config_key(r)]
+        for metric in ("p50_ms", "p95_ms", "peak_rss_mb"):
+            if r[metric] > b[metric] * (1 + tolerance):
+                regressions.append((config_key(r), metric, b[metric], r[metric]))
+        if r["images_per_s"] < b["images_per_s"] * (1 - tolerance):
+            regressions.append((config_key(r), "images_per_s", b["images_per_s"], r["images_per_s"]))
+    return regressions
+
+
+def _print_result(result):
+    if "error" in result:
+        print(f"{config_key(result):45s} ERROR {result['error']}", file=sys.stderr)
+    elif "skipped" in result:
+        print(f"{config_key(result):45s} SKIPPED {result['skipped']}", file=sys.stderr)
+    else:
+        print(f"{config_key(result):45s} cold {result['cold_start_s']:6.2f}s  "
+              f"p50 {result['p50_ms']:7.1f}ms  p95 {result['p95_ms']:7.1f}ms  "
+              f"p99 {result['p99_ms']:7.1f}ms  {result['images_per_s']:6.1f} img/s  "
+              f"rss {result['peak_rss_mb']:6.0f}MB")
+
+
+def main(argv=None):
+    from detector_registry import DETECTORS, resolve_weights
+    from export_backends import BACKENDS, select_artifact
+
+    parser = argparse.ArgumentParser(description="Benchmark the detection models")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--models", nargs="+", choices=sorted(DETECTORS), default=sorted(DETECTORS))
+    parser.add_argument("--backend", nargs="+", choices=("pt",) + BACKENDS, default=["pt"])
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640])
+    parser.add_argument("--batch", nargs="+", type=int, default=[1])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--samples", help="directory of fixed sample images")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_config(json.loads(args.worker))))
+        return 0
+
+    weights = {}
+    for name in args.models:
+        try:
+            weights[name] = resolve_weights(DETECTORS[name])
+        except FileNotFoundError as e:
+            print(f"skipping {name}: {e}", file=sys.stderr)
+
+    image_sets = ["synthetic"] + ([args.samples] if args.samples else [])
+    results = []
+    for model, backend, imgsz, batch, image_set in itertools.product(
+            weights, args.backend, args.imgsz, args.batch, image_sets):
+        for threads in (args.threads if backend == "pt" else [None]):
+            config = dict(model=model, backend=backend, imgsz=imgsz, batch=batch, threads=threads,
+                          image_set=image_set, iterations=args.iterations, warmup=max(1, args.warmup))
+            if backend != "pt" and select_artifact(weights[model], backend) == weights[model]:
+                # The registry would load the .pt weights under this backend's name
+                result = dict(config, skipped=f"no accepted {backend} artifact for {weights[model]}")
+            else:
+                result = spawn(config)
+            results.append(result)
+            _print_result(result)
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for key, metric, old, new in regressions:
+            print(f"REGRESSION {key} {metric}: {old} -> {new}")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
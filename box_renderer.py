@@ -0,0 +1,128 @@
+"""
+Shared box/label renderer for the detection apps.
+
+Boxes come in as one :class:`~detections.Detections`, are converted to Python
+ints once, and are drawn in a single pass.  Colours and label text are worked
+out once per class and text metrics are cached per label string, so crowded
+scenes (parking lots, construction sites) do not pay for hundreds of repeated
+``getTextSize`` calls.
+"""
+
+from functools import lru_cache
+
+import cv2
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@lru_cache(maxsize=4096)
+def text_size(text, font_scale, thickness):
+    """Cached ``cv2.getTextSize`` -> ``((w, h), baseline)``."""
+    return cv2.getTextSize(text, FONT, font_scale, thickness)
+
+
+# ultralytics' default per-class palette (``results.plot()``), RGB hex, kept
+# here so drawing never has to import ultralytics
+ULTRALYTICS_PALETTE = (
+    "042AFF", "0BDBEB", "F3F3F3", "00DFB7", "111F68", "FF6FDD", "FF444F", "CCED00", "00F344", "BD00FF",
+    "00B4FF", "DD00BA", "00FFFF", "26C000", "01FFB3", "7D24FF", "7B0068", "FF1B6C", "FC6D2F", "A2FF0B",
+)
+_PALETTE_BGR = tuple((int(h[4:6], 16), int(h[2:4], 16), int(h[0:2], 16)) for h in ULTRALYTICS_PALETTE)
+
+
+def fixed_color(box_color, text_color=(0, 0, 0)):
+    """Colour function giving every class the same colours."""
+    return lambda cls_id, label: (box_color, text_color)
+
+
+def palette_color(text_color=(255, 255, 255)):
+    """Colour function using ultralytics' per-class palette (BGR)."""
+    return lambda cls_id, label: (_PALETTE_BGR[int(cls_id) % len(_PALETTE_BGR)], text_color)
+
+
+class BoxRenderer:
+    """Draws boxes, label tags and optional zoom insets with one app's style.
+
+    ``colors(cls_id, label)`` returns ``(box_color, text_color)`` in the
+    channel order of the image being drawn on.  ``label_format`` may use
+    ``{label}``, ``{conf}`` (0-1) and ``{pct}`` (0-100).  With
+    ``label_background`` the label sits on a filled tag above the box,
+    otherwise it is drawn in the box colour.  ``insets`` > 0 adds that many
+    magnified crops down the right edge (the fruit app's zoom view).
+    """
+
+    def __init__(self, names, colors, label_format="{label} {conf:.2f}",
+                 box_thickness=2, font_scale=0.6, text_thickness=2,
+                 label_background=True, default_label="Class {}",
+                 insets=0, inset_size=150):
+        self.names = names
+        self.colors = colors
+        self.label_format = label_format
+        self.box_thickness = box_thickness
+        self.font_scale = font_scale
+        self.text_thickness = text_thickness
+        self.label_background = label_background
+        self.default_label = default_label
+        self.insets = insets
+        self.inset_size = inset_size
+
+    def _class_style(self, cls_id):
+        label = self.names.get(cls_id, self.default_label.format(cls_id))
+        box_color, text_color = self.colors(cls_id, label)
+        return label, box_color, text_color
+
+    def render(self, img, dets, out=None):
+        """Draw ``dets`` onto ``out`` (a copy of ``img`` by default) and return it.
+
+        Zoom insets are cut from ``img``, so pass the untouched frame there
+        when drawing in place.
+        """
+        if out is None:
+            out = img.copy()
+        if len(dets) == 0:
+            return out
+
+        boxes = dets.xyxy.astype(int).tolist()
+        confs = dets.conf.tolist()
+        classes = dets.cls.tolist()
+        styles = {c: self._class_style(c) for c in set(classes)}
+
+        crops = []
+        if self.insets:
+            # Take crops before anything is drawn over them
+            for (x1, y1, x2, y2), cls_id in zip(boxes[:self.insets], classes):
+                crops.append((img[max(y1, 0):y2, max(x1, 0):x2].copy(), cls_id, x2, y1))
+
+        font_scale, thickness = self.font_scale, self.text_thickness
+        for (x1, y1, x2, y2), conf, cls_id in zip(boxes, confs, classes):
+            label, box_color, text_color = styles[cls_id]
+            cv2.rectangle(out, (x1, y1), (x2, y2), box_color, self.box_thickness)
+
+            text = self.label_format.format(label=label, conf=conf, pct=int(conf * 100))
+            if self.label_background:
+                (tw, th), _ = text_size(text, font_scale, thickness)
+                cv2.rectangle(out, (x1, max(0, y1 - th - 10)), (x1 + tw + 10, y1), box_color, -1)
+                cv2.putText(out, text, (x1 + 5, y1 - 7), FONT, font_scale, text_color, thickness)
+            else:
+                cv2.putText(out, text, (x1, max(y1 - 10, 20)), FONT, font_scale, box_color, thickness)
+
+        if crops:
+            self._draw_insets(out, crops, styles)
+        return out
+
+    def _draw_insets(self, out, crops, styles):
+        size = self.inset_size
+        h, w = out.shape[:2]
+        # Placement logic to avoid overlapping: one column down the right edge
+        z_x = w - size - 20
+        for n, (crop, cls_id, x2, y1) in enumerate(crops, start=1):
+            z_y = 20 + (n - 1) * (size + 20)
+            if crop.size == 0 or z_x < 0 or z_y + size >= h:
+                continue
+            color = styles[cls_id][1]
+            zoom_view = cv2.resize(crop, (size, size))
+            cv2.rectangle(zoom_view, (0, 0), (size - 1, size - 1), color, 3)
+            out[z_y:z_y + size, z_x:z_x + size] = zoom_view
+            cv2.putText(out, f"SCAN #{n}", (z_x, z_y - 5), FONT, 0.5, color, 1)
+            # Thin line connecting box to zoom
+            cv2.line(out, (x2, y1), (z_x, z_y), color, 1)
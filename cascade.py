@@ -0,0 +1,124 @@
+"""
+Two-stage helmet -> license-plate cascade.
+
+Enforcement only needs the plates of riders without a helmet.  The helmet
+model runs on the full frame first; the plate model then runs only on
+expanded crops around ``No_helmet`` detections (mostly extended downwards,
+where the vehicle's plate is), batched into one call at a crop-sized input.
+Frames without violators never touch the plate model.
+
+Compute is compared as model input pixels: one full-frame plate pass at
+``imgsz`` versus the batched crops actually run.
+"""
+
+import math
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from detections import Detections
+from tiled_inference import nms
+
+# Crop around a violator box, in multiples of its width/height:
+# (left, top, right, bottom)
+DEFAULT_EXPAND = (1.0, 0.5, 1.0, 4.0)
+MIN_CROP_IMGSZ = 160
+
+
+def is_violation(label):
+    """``No_helmet`` style class names (same rule the helmet app colours red)."""
+    return "no" in label.lower()
+
+
+def expand_box(box, image_shape, expand=DEFAULT_EXPAND):
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1, y2 - y1
+    left, top, right, bottom = expand
+    img_h, img_w = image_shape[:2]
+    return (
+        int(max(0, x1 - left * w)),
+        int(max(0, y1 - top * h)),
+        int(min(img_w, x2 + right * w)),
+        int(min(img_h, y2 + bottom * h)),
+    )
+
+
+def letterboxed_pixels(shape, imgsz):
+    """Input pixels ultralytics feeds the model for one image of ``shape``."""
+    h, w = shape[:2]
+    scale = imgsz / max(h, w)
+    return (math.ceil(h * scale / 32) * 32) * (math.ceil(w * scale / 32) * 32)
+
+
+@dataclass
+class CascadeResult:
+    violators: Detections
+    plates: Detections
+    # One dict per violator: its box, the best plate found in its crop (if any)
+    pairs: list = field(default_factory=list)
+    crops_run: int = 0
+    crop_imgsz: int = 0
+    full_frame_pixels: int = 0
+    cascade_pixels: int = 0
+
+    @property
+    def compute_saved(self):
+        """Fraction of plate-model input pixels avoided vs. a full-frame pass."""
+        if not self.full_frame_pixels:
+            return 0.0
+        return 1.0 - self.cascade_pixels / self.full_frame_pixels
+
+    @property
+    def total_saved(self):
+        """Same, over helmet + plate models together (helmet pass counted once)."""
+        if not self.full_frame_pixels:
+            return 0.0
+        both = 2 * self.full_frame_pixels
+        return 1.0 - (self.full_frame_pixels + self.cascade_pixels) / both
+
+
+def run_cascade(helmet_dets, helmet_names, plate_detector, img, plate_conf=0.4,
+                imgsz=640, expand=DEFAULT_EXPAND):
+    """Run ``plate_detector`` only around violators in ``helmet_dets``.
+
+    ``helmet_dets`` are the (already thresholded) helmet detections for
+    ``img``.  Returns a :class:`CascadeResult`; plate boxes are in full-frame
+    coordinates.
+    """
+    labels = helmet_dets.labels(helmet_names)
+    mask = np.array([is_violation(label) for label in labels], dtype=bool)
+    violators = helmet_dets.select(mask) if len(helmet_dets) else helmet_dets
+    result = CascadeResult(violators, Detections.empty(),
+                           full_frame_pixels=letterboxed_pixels(img.shape, imgsz))
+    if len(violators) == 0:
+        return result
+
+    windows = [expand_box(box, img.shape, expand) for box in violators.xyxy.tolist()]
+    crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    longest = max(max(c.shape[:2]) for c in crops)
+    crop_imgsz = int(min(imgsz, max(MIN_CROP_IMGSZ, math.ceil(longest / 32) * 32)))
+
+    # Mixed crop shapes are letterboxed to a square crop_imgsz input each
+    results = plate_detector(crops, conf=plate_conf, imgsz=crop_imgsz, verbose=False)
+
+    parts = []
+    for i, ((x1, y1, _, _), res) in enumerate(zip(windows, results)):
+        plates = Detections.from_result(res)
+        plates.xyxy += np.array([x1, y1, x1, y1], np.float32)
+        parts.append(plates)
+        pair = {"violator_box": violators.xyxy[i].tolist(),
+                "violator_conf": float(violators.conf[i]),
+                "plate_box": None, "plate_conf": None}
+        if len(plates):
+            best = int(np.argmax(plates.conf))
+            pair["plate_box"] = plates.xyxy[best].tolist()
+            pair["plate_conf"] = float(plates.conf[best])
+        result.pairs.append(pair)
+
+    # Neighbouring violators can share a plate in overlapping crops
+    result.plates = nms(Detections.concat(parts))
+
+    result.crops_run = len(crops)
+    result.crop_imgsz = crop_imgsz
+    result.cascade_pixels = len(crops) * crop_imgsz * crop_imgsz
+    return result
@@ -1,6 +1,17 @@
-from ultralytics import YOLO
 import os
 
+from checkpoint_meta import read_metadata, validate_names
+
 path = "fruit_best.pt" if os.path.exists("fruit_best.pt") else "yolov8n.pt"
-model = YOLO(path)
-print(model.names)
+if os.path.exists(path):
+    # Reads the names straight from the checkpoint; no model is built
+    meta = read_metadata(path)
+else:
+    # Not on disk: let ultralytics fetch the stock weights, as it always did
+    from ultralytics import YOLO
+
+    names = YOLO(path).names
+    meta = {"names": names, "nc": len(names)}
+print(meta["names"])
+for problem in validate_names(meta["names"], meta["nc"]):
+    print("!", problem)
@@ -0,0 +1,268 @@
+"""
+Read YOLO checkpoint metadata without building the model.
+
+A ``.pt`` checkpoint is a zip whose ``data.pkl`` pickles the whole model.
+Instead of importing torch/ultralytics and building the network just to look
+at ``model.names``, :func:`read_metadata` unpickles ``data.pkl`` with every
+torch/ultralytics class replaced by an inert stand-in and no tensor storage
+loaded, then pulls out the class names, imgsz, task and training args.
+
+Results are kept in a small ``.checkpoint_index.json`` next to the weights,
+keyed by the file's SHA-1 (rehashed only when its size or mtime changes), so
+a repeated lookup is a ``stat`` and a JSON read — cheap enough for health
+checks.
+
+    python checkpoint_meta.py fruit_best.pt            # names, imgsz, task
+    python checkpoint_meta.py fruit_best.pt --check    # exit 1 on a bad name map
+    python checkpoint_meta.py fruit_best.pt --repair-with fruit
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import zipfile
+
+INDEX_NAME = ".checkpoint_index.json"
+# Stdlib globals a checkpoint may legitimately need rebuilt for real
+_SAFE_GLOBALS = {
+    ("collections", "OrderedDict"),
+    ("collections", "defaultdict"),
+    ("builtins", "set"),
+    ("builtins", "frozenset"),
+    ("builtins", "slice"),
+    ("builtins", "object"),
+    ("copyreg", "_reconstructor"),
+}
+# Strings that leak into names when dataset metadata lands in the class list
+_CORRUPT_NAME = re.compile(r"dataset|created on|roboflow|https?://|\.yaml$|\n", re.I)
+
+
+class _Stub:
+    """Stand-in for any class or function referenced by the checkpoint."""
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple) and len(state) == 2:
+            state = {**(state[0] or {}), **(state[1] or {})}
+        if isinstance(state, dict):
+            self.__dict__.update(state)
+
+
+class _MetadataUnpickler(pickle.Unpickler):
+    _stubs = {}
+
+    def find_class(self, module, name):
+        if (module, name) in _SAFE_GLOBALS:
+            return super().find_class(module, name)
+        key = f"{module}.{name}"
+        if key not in self._stubs:
+            self._stubs[key] = type(name, (_Stub,), {"__module__": module})
+        return self._stubs[key]
+
+    def persistent_load(self, pid):
+        # Tensor storages: never read
+        return None
+
+
+def _load_pickle(path):
+    with zipfile.ZipFile(path) as archive:
+        pkl = next((n for n in archive.namelist() if n.endswith("data.pkl")), None)
+        if pkl is None:
+            raise ValueError(f"{path}: no data.pkl in checkpoint")
+        with archive.open(pkl) as f:
+            return _MetadataUnpickler(f).load()
+
+
+def _plain(value):
+    """JSON-safe copy of a metadata value (stand-ins become their repr)."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def extract_metadata(path):
+    """Parse ``path`` (no index); returns a JSON-safe dict."""
+    if not zipfile.is_zipfile(path):
+        raise ValueError(f"{path}: not a zip-format torch checkpoint")
+    ckpt = _load_pickle(path)
+    if not isinstance(ckpt, dict):
+        raise ValueError(f"{path}: unexpected checkpoint layout")
+    model = ckpt.get("ema") or ckpt.get("model")
+    attrs = getattr(model, "__dict__", {})
+    names = attrs.get("names") or {}
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    yaml = attrs.get("yaml") or {}
+    model_args = attrs.get("args") or {}
+    train_args = ckpt.get("train_args") or {}
+    if not isinstance(model_args, dict):
+        model_args = getattr(model_args, "__dict__", {})
+    return {
+        "names": {str(int(k)): str(v) for k, v in names.items()},
+        "nc": yaml.get("nc") if isinstance(yaml, dict) else None,
+        "task": train_args.get("task") or model_args.get("task") or attrs.get("task"),
+        "imgsz": train_args.get("imgsz") or model_args.get("imgsz"),
+        "train_args": _plain(train_args),
+        "version": ckpt.get("version"),
+        "date": ckpt.get("date"),
+        "epoch": ckpt.get("epoch"),
+    }
+
+
+# ---------------------------
+# Sidecar index
+# ---------------------------
+def file_sha1(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def index_path(weights):
+    return os.path.join(os.path.dirname(os.path.abspath(weights)), INDEX_NAME)
+
+
+def _read_index(path):
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "metadata": {}}
+    index.setdefault("files", {})
+    index.setdefault("metadata", {})
+    return index
+
+
+def _write_index(path, index):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except OSError:
+        # Read-only deployment dir: the index is only a cache
+        pass
+
+
+def read_metadata(weights, use_index=True):
+    """Metadata of ``weights`` (``names`` keyed by int), via the sidecar index."""
+    if not use_index:
+        meta = extract_metadata(weights)
+    else:
+        stat = os.stat(weights)
+        idx_path = index_path(weights)
+        index = _read_index(idx_path)
+        name = os.path.basename(weights)
+        entry = index["files"].get(name)
+        dirty = False
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            digest = entry["sha1"]
+        else:
+            # The same bytes under another name (or re-touched) reuse their entry
+            digest = file_sha1(weights)
+            index["files"][name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                    "sha1": digest}
+            dirty = True
+        meta = index["metadata"].get(digest)
+        if meta is None:
+            meta = extract_metadata(weights)
+            index["metadata"][digest] = meta
+            dirty = True
+        if dirty:
+            # Drop metadata no file points at any more
+            live = {f["sha1"] for f in index["files"].values()}
+            index["metadata"] = {k: v for k, v in index["metadata"].items() if k in live}
+            _write_index(idx_path, index)
+        meta = dict(meta, sha1=digest)
+    meta["names"] = {int(k): v for k, v in sorted(meta["names"].items(), key=lambda kv: int(kv[0]))}
+    return meta
+
+
+# ---------------------------
+# Name map validation
+# ---------------------------
+def is_corrupted_name(name):
+    """True for labels that are really leaked dataset metadata, not class names."""
+    return not str(name).strip() or bool(_CORRUPT_NAME.search(str(name)))
+
+
+def validate_names(names, nc=None):
+    """Problems found in a ``{id: name}`` map, as human-readable strings."""
+    problems = []
+    ids = sorted(names)
+    expected = nc if nc is not None else len(names)
+    if ids != list(range(expected)):
+        problems.append(f"ids are {ids[:3]}...{ids[-3:]}, expected 0..{expected - 1}" if ids
+                        else "no class names")
+    for cls_id, name in sorted(names.items()):
+        if is_corrupted_name(name):
+            problems.append(f"class {cls_id}: {name!r} looks like dataset metadata")
+    seen = {}
+    for cls_id, name in sorted(names.items()):
+        if name in seen:
+            problems.append(f"class {cls_id}: duplicate of class {seen[name]} ({name!r})")
+        seen.setdefault(name, cls_id)
+    return problems
+
+
+def repair_names(names, override=None, nc=None):
+    """A name map with overrides applied and remaining corrupted entries replaced."""
+    count = max(nc or 0, max(names, default=-1) + 1, max(override or {}, default=-1) + 1)
+    repaired = {}
+    for cls_id in range(count):
+        name = (override or {}).get(cls_id, names.get(cls_id))
+        repaired[cls_id] = f"class_{cls_id}" if name is None or is_corrupted_name(name) else name
+    return repaired
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect YOLO checkpoint metadata")
+    parser.add_argument("weights", nargs="+")
+    parser.add_argument("--json", action="store_true", help="print the full metadata as JSON")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a name map is invalid")
+    parser.add_argument("--repair-with", metavar="DETECTOR",
+                        help="show names repaired with a detector_registry name override")
+    parser.add_argument("--no-index", action="store_true")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for weights in args.weights:
+        try:
+            meta = read_metadata(weights, use_index=not args.no_index)
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            print(f"{weights}: {e}", file=sys.stderr)
+            failed = True
+            continue
+        problems = validate_names(meta["names"], meta["nc"])
+        failed |= bool(problems)
+        if args.json:
+            print(json.dumps(dict(meta, problems=problems), indent=2, default=str))
+        else:
+            print(f"{weights}: task={meta['task']} imgsz={meta['imgsz']} "
+                  f"classes={len(meta['names'])}")
+            for cls_id, name in meta["names"].items():
+                print(f"  {cls_id}: {name}")
+            for problem in problems:
+                print(f"  ! {problem}")
+        if args.repair_with:
+            from detector_registry import DETECTORS
+
+            override = DETECTORS[args.repair_with].names
+            print("repaired:", repair_names(meta["names"], override, meta["nc"]))
+    return 1 if failed and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
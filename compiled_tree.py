@@ -0,0 +1,338 @@
+"""
+Fitted weather Decision Trees compiled to flat arrays for batch scoring.
+
+``pipeline.predict(frame)`` validates the frame, runs every column through
+the ``ColumnTransformer`` (a float64 copy per step, one-hot columns for
+every category), converts the result to float32 and only then walks the
+tree.  A tree of depth 8 reads at most 8 of those features per row.
+:func:`compile_tree` exports the fitted preprocessing + tree as plain
+arrays instead:
+
+* only the features the tree splits on are kept; each is either a numeric
+  column with its imputation value and scaler constants, or an indicator
+  "column == category" with the categorical imputation folded in (unknown
+  categories give 0, as ``handle_unknown="ignore"``);
+* the nodes become ``left``/``right``/``feature``/``threshold`` arrays,
+  thresholds rounded down to float32 (the tree compares float32 features,
+  so ``x <= t`` keeps its outcome), and each leaf stores its class.
+
+:meth:`CompiledTree.predict` then scores ``BATCH_ROWS`` rows at a time:
+the used features of the batch are computed column-wise, exactly as
+sklearn computes them, and all rows descend the tree together, one
+vectorized step per level, dropping out as they reach a leaf.  Input can
+be a DataFrame, a dict of arrays or a structured array — in particular a
+readings file from :func:`write_readings` opened with
+``np.load(path, mmap_mode="r")``, so only the batch being scored is read
+into memory.  Predictions are identical to the pipeline's.
+
+    compiled = compile_tree(pipeline)          # Pipeline(preprocessor, tree)
+    compiled.save("weather_tree.npz")
+    python compiled_tree.py predict weather_tree.npz readings.npy --out labels.npy
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MODEL = "weather_tree.npz"
+BATCH_ROWS = 1 << 16
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def _steps(transformer):
+    return [step for _, step in transformer.steps] if hasattr(transformer, "steps") else [transformer]
+
+
+def _output_features(preprocessor):
+    """One spec per output column of the fitted ``ColumnTransformer``, in order.
+
+    A spec is ``(column, fill, center, scale, category)``: a numeric column
+    has ``category`` None, an indicator has ``center``/``scale`` None.
+    """
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+
+    specs = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == "drop" or len(columns) == 0:
+            continue
+        columns = [preprocessor.feature_names_in_[c] if isinstance(c, (int, np.integer)) else c
+                   for c in columns]
+        fill = [None] * len(columns)
+        center, scale = [0.0] * len(columns), [1.0] * len(columns)
+        encoder = None
+        for step in [] if transformer == "passthrough" else _steps(transformer):
+            if isinstance(step, SimpleImputer):
+                if step.add_indicator or len(step.statistics_) != len(columns) or (
+                        step.statistics_.dtype.kind == "f" and np.isnan(step.statistics_).any()):
+                    raise ValueError(f"{name}: unsupported imputer (indicator or dropped columns)")
+                if not pd.isna(step.missing_values):
+                    raise ValueError(f"{name}: only NaN missing values are supported")
+                fill = list(step.statistics_)
+            elif isinstance(step, StandardScaler):
+                center = list(step.mean_) if step.with_mean else [0.0] * len(columns)
+                scale = list(step.scale_) if step.with_std else [1.0] * len(columns)
+            elif isinstance(step, FunctionTransformer) and step.func is None:
+                # "passthrough" columns, fitted
+                continue
+            elif isinstance(step, OneHotEncoder):
+                if step.drop_idx_ is not None or getattr(step, "infrequent_categories_", None):
+                    raise ValueError(f"{name}: one-hot drop/infrequent categories are not supported")
+                encoder = step
+            else:
+                raise ValueError(f"{name}: cannot compile {type(step).__name__}")
+        for i, column in enumerate(columns):
+            if encoder is None:
+                specs.append((column, fill[i], float(center[i]), float(scale[i]), None))
+            else:
+                specs.extend((column, fill[i], None, None, category)
+                             for category in encoder.categories_[i])
+    return specs
+
+
+def _round_down32(threshold):
+    """Largest float32 at or below each float64 threshold."""
+    down = threshold.astype(np.float32)
+    over = down.astype(np.float64) > threshold
+    down[over] = np.nextafter(down[over], np.float32(-np.inf))
+    return down
+
+
+def compile_tree(model, tree=None):
+    """A :class:`CompiledTree` of a fitted ``Pipeline(preprocessor, tree)``.
+
+    Or pass the fitted ``ColumnTransformer`` and ``DecisionTreeClassifier``
+    separately.  Raises ``ValueError`` for preprocessing steps it cannot
+    reproduce exactly.
+    """
+    preprocessor = model
+    if tree is None:
+        steps = [step for _, step in model.steps]
+        if len(steps) != 2:
+            raise ValueError("expected Pipeline(preprocessor, tree)")
+        preprocessor, tree = steps
+    specs = _output_features(preprocessor)
+    t = tree.tree_
+    if t.n_outputs != 1:
+        raise ValueError("only single-output trees are supported")
+    if len(specs) != t.n_features:
+        raise ValueError(f"preprocessor yields {len(specs)} features, tree expects {t.n_features}")
+
+    internal = t.children_left != -1
+    used = np.unique(t.feature[internal])
+    remap = np.full(t.n_features, -1, dtype=np.int32)
+    remap[used] = np.arange(len(used), dtype=np.int32)
+    feature = np.where(internal, remap[np.where(internal, t.feature, 0)], -1).astype(np.int32)
+    threshold = np.where(internal, _round_down32(t.threshold), np.inf).astype(np.float32)
+    # argmax picks the first of tied classes, as DecisionTreeClassifier.predict
+    leaf_class = t.value[:, 0, :].argmax(axis=1).astype(np.int32)
+    return CompiledTree(
+        specs=[specs[i] for i in used],
+        left=t.children_left.astype(np.int32), right=t.children_right.astype(np.int32),
+        feature=feature, threshold=threshold, leaf_class=leaf_class,
+        classes=tree.classes_.tolist(), depth=int(t.max_depth),
+    )
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+def _is_missing(values):
+    if values.dtype.kind in "US":
+        # Record files store missing text as ""
+        return values == values.dtype.type()
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    return pd.isna(values)
+
+
+def _column_names(readings):
+    if isinstance(readings, pd.DataFrame):
+        return list(readings.columns)
+    if isinstance(readings, np.ndarray):
+        return list(readings.dtype.names or ())
+    return list(readings)
+
+
+def _batches(readings, columns, batch_rows):
+    """``(rows, {column: array})`` for consecutive row ranges of ``readings``."""
+    names = _column_names(readings)
+    missing = set(columns) - set(names)
+    if missing:
+        raise KeyError(f"readings lack columns {sorted(missing)}")
+    if isinstance(readings, pd.DataFrame):
+        arrays = {c: readings[c].to_numpy() for c in columns}
+        n = len(readings)
+    else:
+        arrays = {c: readings[c] for c in columns}
+        n = len(readings) if isinstance(readings, np.ndarray) else len(readings[names[0]]) if names else 0
+    for start in range(0, n, batch_rows):
+        # Slicing a memory-mapped column reads only these rows
+        yield min(batch_rows, n - start), {c: a[start:start + batch_rows] for c, a in arrays.items()}
+
+
+class CompiledTree:
+    """Preprocessing + decision tree as flat arrays; see the module docstring."""
+
+    def __init__(self, specs, left, right, feature, threshold, leaf_class, classes, depth):
+        self.specs = [tuple(spec) for spec in specs]
+        self.left, self.right = left, right
+        self.feature, self.threshold = feature, threshold
+        self.leaf_class = leaf_class
+        self.classes = np.asarray(classes)
+        self.depth = depth
+        # children[2 * node] is the left child, children[2 * node + 1] the right
+        self._children = np.stack([left, right], axis=1).ravel()
+
+    @property
+    def columns(self):
+        """Input columns the tree needs, in first-use order."""
+        return list(dict.fromkeys(spec[0] for spec in self.specs))
+
+    def features(self, batch, rows):
+        """Float32 ``rows`` x used-features matrix for a ``{column: array}`` batch."""
+        out = np.empty((rows, len(self.specs)), dtype=np.float32)
+        for j, (column, fill, center, scale, category) in enumerate(self.specs):
+            values = np.asarray(batch[column])
+            if category is None:
+                # (x - mean) / scale in float64 and then float32, as the
+                # scaler and the tree's input conversion compute it
+                x = values.astype(np.float64)
+                if fill is not None:
+                    x[_is_missing(values)] = fill
+                elif np.isnan(x).any():
+                    # The tree would route NaN by rules learned in training
+                    raise ValueError(f"{column!r} has missing values and no imputer")
+                out[:, j] = (x - center) / scale
+            else:
+                # Unknown categories match no indicator
+                hit = values == category
+                if fill is not None and fill == category:
+                    hit |= _is_missing(values)
+                out[:, j] = hit
+        return out
+
+    def predict_codes(self, batch, rows):
+        """Index into :attr:`classes` of the prediction for each of the ``rows`` of ``batch``."""
+        X = self.features(batch, rows)
+        flat, width = X.ravel(), X.shape[1]
+        node = np.zeros(rows, dtype=np.int32)
+        active = np.arange(rows) if self.feature[0] >= 0 else np.empty(0, dtype=np.intp)
+        at = node[active]
+        while len(active):
+            # One level for every row not yet at a leaf
+            right = ~(flat[active * width + self.feature[at]] <= self.threshold[at])
+            at = self._children[2 * at + right]
+            done = self.feature[at] < 0
+            if done.any():
+                node[active[done]] = at[done]
+                active, at = active[~done], at[~done]
+        return self.leaf_class[node]
+
+    def predict(self, readings, batch_rows=BATCH_ROWS):
+        """Predicted class of every row of ``readings``, ``batch_rows`` rows at a time."""
+        parts = [self.predict_codes(batch, rows)
+                 for rows, batch in _batches(readings, self.columns, batch_rows)]
+        codes = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+        return self.classes[codes]
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    def save(self, path=DEFAULT_MODEL):
+        """Write the compiled tree to ``path`` (``.npz``) atomically."""
+        meta = {"specs": [[_plain(v) for v in spec] for spec in self.specs],
+                "classes": self.classes.tolist(), "depth": self.depth}
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, left=self.left, right=self.right, feature=self.feature,
+                            threshold=self.threshold, leaf_class=self.leaf_class,
+                            meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL):
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            arrays = {k: f[k] for k in ("left", "right", "feature", "threshold", "leaf_class")}
+        return cls(specs=meta["specs"], classes=meta["classes"], depth=meta["depth"], **arrays)
+
+
+def _plain(value):
+    """JSON-friendly form of numpy scalars."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# ---------------------------
+# Readings files
+# ---------------------------
+def write_readings(frame, path):
+    """Save ``frame`` as a structured ``.npy`` that ``np.load(mmap_mode="r")`` can map.
+
+    Numeric columns keep their dtype; text becomes fixed-width unicode with
+    missing values as "".
+    """
+    fields, columns = [], {}
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = series.to_numpy()
+        else:
+            values = series.astype(object).where(series.notna(), "").astype(str).to_numpy()
+            values = values.astype(f"U{max(1, int(pd.Series(values).str.len().max() or 1))}")
+        columns[column] = values
+        fields.append((column, values.dtype))
+    records = np.empty(len(frame), dtype=fields)
+    for column, values in columns.items():
+        records[column] = values
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, records)
+    os.replace(tmp, path)
+    return path
+
+
+def predict_file(model, path, out=None, batch_rows=BATCH_ROWS):
+    """Labels for a readings file, memory-mapped; optionally saved to ``out``."""
+    compiled = CompiledTree.load(model) if isinstance(model, str) else model
+    labels = compiled.predict(np.load(path, mmap_mode="r"), batch_rows)
+    if out:
+        tmp = f"{out}.{os.getpid()}.tmp.npy"
+        np.save(tmp, labels.astype(str))
+        os.replace(tmp, out)
+    return labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score readings with a compiled decision tree")
+    sub = parser.add_subparsers(dest="action", required=True)
+    predict = sub.add_parser("predict", help="predict a readings .npy (see write_readings)")
+    predict.add_argument("model")
+    predict.add_argument("readings")
+    predict.add_argument("--out")
+    predict.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    convert = sub.add_parser("convert", help="turn a CSV into a readings .npy")
+    convert.add_argument("csv")
+    convert.add_argument("readings")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.action == "convert":
+        write_readings(pd.read_csv(args.csv), args.readings)
+        print(f"wrote {args.readings} in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+        return 0
+    labels = predict_file(args.model, args.readings, args.out, args.batch_rows)
+    print(f"{len(labels):,} rows scored in {time.perf_counter() - t0:.2f}s", file=sys.stderr)
+    if not args.out:
+        for label, count in zip(*np.unique(labels, return_counts=True)):
+            print(f"{label}\t{count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Plain NumPy view of YOLO detections.
+
+``Detections.from_result`` pulls the whole ``boxes.data`` tensor
+(``x1, y1, x2, y2, conf, cls`` per row) off the model in one transfer, so the
+apps never touch per-box tensors like ``box.cls[0]`` / ``box.xyxy[0]``.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def ios_matrix(a, b):
+    """Pairwise intersection over the smaller box's area, (N, 4) x (M, 4) xyxy."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (np.minimum(area_a[:, None], area_b[None, :]) + 1e-9)
+
+
+@dataclass
+class Detections:
+    """Boxes as contiguous arrays: ``xyxy`` (N, 4), ``conf`` (N,), ``cls`` (N,)."""
+    xyxy: np.ndarray
+    conf: np.ndarray
+    cls: np.ndarray
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32))
+
+    @classmethod
+    def from_result(cls, result):
+        """Build from one ultralytics ``Results`` object.
+
+        Remote detectors already return :class:`Detections`; those pass through.
+        """
+        if isinstance(result, Detections):
+            return result
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls.empty()
+        data = boxes.data.cpu().numpy()
+        return cls.from_array(data)
+
+    @classmethod
+    def from_array(cls, data):
+        """Build from an (N, 6) ``x1, y1, x2, y2, conf, cls`` array."""
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        return cls(
+            np.ascontiguousarray(data[:, :4]),
+            np.ascontiguousarray(data[:, 4]),
+            data[:, 5].astype(np.int32),
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        """Stack several :class:`Detections` into one."""
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls(
+            np.concatenate([p.xyxy for p in parts]),
+            np.concatenate([p.conf for p in parts]),
+            np.concatenate([p.cls for p in parts]),
+        )
+
+    def to_array(self):
+        """Inverse of :meth:`from_array`."""
+        return np.column_stack([self.xyxy, self.conf, self.cls.astype(np.float32)])
+
+    def __len__(self):
+        return len(self.conf)
+
+    def select(self, mask):
+        """Subset by boolean mask or index array."""
+        return Detections(self.xyxy[mask], self.conf[mask], self.cls[mask])
+
+    def filter(self, min_conf):
+        """Keep only boxes with confidence >= ``min_conf``."""
+        return self.select(self.conf >= min_conf)
+
+    def labels(self, names, default="Class {}"):
+        """Class name for every box."""
+        return [names.get(c, default.format(c)) for c in self.cls.tolist()]
@@ -0,0 +1,344 @@
+"""
+Shared YOLO detector registry for the detection apps.
+
+Every app (mask, helmet, license plate, fruit) asks this module for its model
+instead of keeping a private ``@st.cache_resource`` copy.  Models are keyed by
+weights path + mtime + class-name override, so retraining a model (new mtime)
+or overriding its names gives a fresh entry, while every other caller in the
+same process shares the loaded weights.
+
+Loaded models are kept under a RAM budget (``DETECTOR_RAM_BUDGET_MB``, default
+1024 MB).  When a new model would exceed it, the least recently used models are
+dropped first, so a box hosting all four apps only keeps the busy ones resident.
+
+``DETECTOR_BACKEND`` (``auto`` by default, or ``pt`` / ``onnx`` / ``onnx-int8``
+/ ``openvino``) chooses between the ``.pt`` weights and exported artifacts
+that passed the parity check in :mod:`export_backends`.
+
+With ``INFERENCE_SERVICE`` (``host:port``) set, :func:`load_detector` hands
+out clients of :mod:`inference_service` instead, which owns the models.
+"""
+
+import gc
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from instrumentation import current_trace
+
+DEFAULT_BUDGET_MB = 1024
+
+# Mapping for fixed fruit names (forced override for corrupted model metadata)
+FRUIT_NAMES = {
+    0: "Banana",
+    1: "Pineapple",
+    2: "Apple",
+    3: "Orange",
+    4: "Mango",
+    5: "Grapes",
+    6: "Strawberry",
+    7: "Watermelon"
+}
+
+
+@dataclass(frozen=True)
+class DetectorSpec:
+    """Where an app's weights live and how its class names are fixed up."""
+    weights: str
+    fallbacks: tuple = ()
+    names: dict = field(default=None, hash=False)
+    # Hand the last candidate to ultralytics even if it is not on disk
+    # (stock weights such as ``yolov11n.pt`` are fetched on first use)
+    remote_ok: bool = False
+
+    @property
+    def candidates(self):
+        return (self.weights,) + tuple(self.fallbacks)
+
+
+DETECTORS = {
+    "mask": DetectorSpec("best.pt"),
+    "helmet": DetectorSpec("helmet_best.pt", fallbacks=("best.pt",)),
+    "license": DetectorSpec("license_best.pt"),
+    "fruit": DetectorSpec("fruit_best.pt", fallbacks=("yolov11n.pt",),
+                          names=FRUIT_NAMES, remote_ok=True),
+}
+
+
+def resolve_weights(spec):
+    """Return the first weights file of ``spec`` that exists on disk."""
+    for path in spec.candidates:
+        if os.path.exists(path):
+            return path
+    if spec.remote_ok:
+        return spec.candidates[-1]
+    raise FileNotFoundError(f"'{spec.weights}' model file is missing")
+
+
+def _names_key(names):
+    if not names:
+        return ()
+    return tuple(sorted((int(k), str(v)) for k, v in names.items()))
+
+
+def _estimate_bytes(model, path):
+    """Resident size of a loaded model: parameters + buffers, else file size."""
+    try:
+        module = model.model
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        pass
+    if os.path.isdir(path):
+        # OpenVINO exports are a directory of .xml/.bin files
+        return sum(os.path.getsize(os.path.join(root, f))
+                   for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class Detector:
+    """A loaded model plus the identity the registry knows it by.
+
+    Calling it runs the underlying YOLO model; ``names`` already has the
+    class-name override applied, so apps never mutate ``model.names``.
+    """
+
+    def __init__(self, model, key, path, names=None, nbytes=0, registry=None):
+        self.model = model
+        self.key = key
+        self.path = path
+        self.nbytes = nbytes
+        self._model_bytes = nbytes
+        self._names_override = dict(names or {})
+        self._registry = registry
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def names(self):
+        names = dict(self.model.names or {})
+        names.update(self._names_override)
+        return names
+
+    @property
+    def identity(self):
+        """Short, stable string for this exact weights file + names."""
+        digest = hashlib.sha1(repr(self.key).encode()).hexdigest()[:12]
+        return f"{os.path.basename(self.path)}@{digest}"
+
+    def __call__(self, source, **kwargs):
+        results = self.model(source, **kwargs)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_model_speed(results)
+        return results
+
+    def replica_pool(self, size):
+        """A long-lived :class:`ReplicaPool` of ``size`` threads for this model.
+
+        The replicas are loaded once, count against the registry's RAM
+        budget and are released when the registry drops this detector.
+        """
+        with self._pool_lock:
+            if self._pool is None or self._pool.size != size:
+                if self._pool is not None:
+                    self._pool.close()
+                self._pool = ReplicaPool(self.path, size)
+                self.nbytes = self._model_bytes * (1 + size)
+                grown = True
+            else:
+                grown = False
+            pool = self._pool
+        if grown and self._registry is not None:
+            self._registry.rebalance(self)
+        return pool
+
+    def close(self):
+        """Shut down the replica pool, if any (the registry calls this on eviction)."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+                self.nbytes = self._model_bytes
+
+
+class ReplicaPool:
+    """Worker threads, each running its own copy of a model.
+
+    ultralytics predictors are not thread-safe, so running one model from
+    several threads at once needs one replica per thread.
+    """
+
+    def __init__(self, path, size):
+        from concurrent.futures import ThreadPoolExecutor
+        from queue import Queue
+
+        from ultralytics import YOLO
+
+        self.size = size
+        self._models = Queue()
+        for _ in range(size):
+            self._models.put(YOLO(path) if path.endswith(".pt") else YOLO(path, task="detect"))
+        self._executor = ThreadPoolExecutor(size, thread_name_prefix="replica")
+
+    def _run(self, fn, item):
+        model = self._models.get()
+        try:
+            return fn(model, item)
+        finally:
+            self._models.put(model)
+
+    def map(self, fn, items):
+        """``fn(model, item)`` for every item, spread over the replicas, in order."""
+        return self._executor.map(lambda item: self._run(fn, item), items)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class DetectorRegistry:
+    """Process-wide LRU of loaded detectors under a RAM budget."""
+
+    def __init__(self, budget_bytes=None):
+        if budget_bytes is None:
+            budget_mb = float(os.environ.get("DETECTOR_RAM_BUDGET_MB", DEFAULT_BUDGET_MB))
+            budget_bytes = int(budget_mb * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    @staticmethod
+    def make_key(path, names=None):
+        abspath = os.path.abspath(path)
+        mtime = os.stat(abspath).st_mtime_ns if os.path.exists(abspath) else 0
+        return (abspath, mtime, _names_key(names))
+
+    def get(self, path, names=None):
+        """Return the detector for ``path``, loading it if needed."""
+        key = self.make_key(path, names)
+        with self._lock:
+            detector = self._entries.get(key)
+            if detector is not None:
+                self._entries.move_to_end(key)
+                return detector
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other apps are not blocked,
+        # but only once per key
+        with key_lock:
+            with self._lock:
+                detector = self._entries.get(key)
+                if detector is not None:
+                    self._entries.move_to_end(key)
+                    return detector
+
+            # Deferred: importing ultralytics/torch alone takes seconds
+            from ultralytics import YOLO
+
+            # Exported artifacts carry no task metadata ultralytics can trust
+            model = YOLO(path) if path.endswith(".pt") else YOLO(path, task="detect")
+            detector = Detector(model, key, path, names, _estimate_bytes(model, path), registry=self)
+
+            with self._lock:
+                self._drop_stale(key)
+                self._entries[key] = detector
+                self._evict(keep=key)
+                self._loading.pop(key, None)
+        return detector
+
+    def load(self, spec, backend=None):
+        """Resolve a :class:`DetectorSpec` (or a ``DETECTORS`` name) and load it.
+
+        ``backend`` defaults to ``DETECTOR_BACKEND``; see :mod:`export_backends`.
+        """
+        from export_backends import select_artifact
+
+        if isinstance(spec, str):
+            spec = DETECTORS[spec]
+        if backend is None:
+            backend = os.environ.get("DETECTOR_BACKEND", "auto")
+        weights = resolve_weights(spec)
+        if os.path.exists(weights):
+            weights = select_artifact(weights, backend)
+        return self.get(weights, spec.names)
+
+    def _drop(self, key):
+        detector = self._entries.pop(key, None)
+        if detector is not None:
+            detector.close()
+
+    def _drop_stale(self, key):
+        # Older mtimes of the same weights file can never be requested again
+        for old in [k for k in self._entries if k[0] == key[0] and k[1] != key[1]]:
+            self._drop(old)
+
+    def _evict(self, keep):
+        evicted = False
+        while self.used_bytes() > self.budget_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._drop(oldest)
+            evicted = True
+        if evicted:
+            gc.collect()
+
+    def rebalance(self, detector):
+        """Re-apply the budget after ``detector`` grew (e.g. loaded replicas)."""
+        with self._lock:
+            if self._entries.get(detector.key) is detector:
+                self._entries.move_to_end(detector.key)
+                self._evict(keep=detector.key)
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(d.nbytes for d in self._entries.values())
+
+    def evict(self, path, names=None):
+        with self._lock:
+            self._drop(self.make_key(path, names))
+        gc.collect()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+        gc.collect()
+
+    def stats(self):
+        """One row per resident detector, least recently used first."""
+        with self._lock:
+            return [
+                {"path": d.path, "identity": d.identity, "mb": round(d.nbytes / 2**20, 1)}
+                for d in self._entries.values()
+            ]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The registry shared by every app running in this process."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DetectorRegistry()
+        return _registry
+
+
+def load_detector(name, backend=None):
+    """Load one of the ``DETECTORS`` through the shared registry.
+
+    Returns a :class:`~inference_service.RemoteDetector` instead when
+    ``INFERENCE_SERVICE`` is set (the service picks its own backend).
+    """
+    address = os.environ.get("INFERENCE_SERVICE")
+    if address:
+        from inference_service import remote_detector
+
+        return remote_detector(name, address)
+    return get_registry().load(name, backend)
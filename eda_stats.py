@@ -0,0 +1,446 @@
+"""
+Statistics for the Superstore EDA in one vectorized pass.
+
+The notebook used to compute ``describe``, ``skew`` and ``kurtosis`` as
+separate passes and, per column, two quantiles plus a filtered DataFrame to
+count outliers.  :func:`summarize` turns the numeric columns into one float
+matrix and derives everything from it at once: moments, quartiles (one
+partial sort per column), IQR fences, the outlier mask and counts, and the
+correlation matrix.
+
+For exports too big to load, :class:`StreamingStats` does the same chunk by
+chunk with mergeable state:
+
+* :class:`Moments` — count/mean/M2..M4, min/max and the co-moment matrix,
+  merged with the pairwise (Chan / Pébay) update, so skew, kurtosis and
+  correlations are exact;
+* :class:`QuantileSketch` — a KLL sketch per column, so quartiles and IQR
+  fences are approximate (rank error ~1% at the default ``k``) in
+  ``O(k log n)`` memory.
+
+:func:`stream_summary` runs one :class:`StreamingStats` per file in a process
+pool and merges them; outliers need the fences first, so
+:func:`stream_outlier_counts` is a second (also parallel) pass.
+
+    from eda_stats import summarize
+    summary = summarize(df)
+    summary.describe(); summary.outlier_counts; summary.corr
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+IQR_FACTOR = 1.5
+DEFAULT_K = 200
+
+
+def numeric_columns(df):
+    return list(df.select_dtypes(include=np.number).columns)
+
+
+def _matrix(df, columns):
+    """Columns as a column-major float64 matrix; missing values become NaN.
+
+    Column-major so every per-column reduction runs over contiguous memory.
+    """
+    x = np.empty((len(df), len(columns)), order="F")
+    for i, col in enumerate(columns):
+        x[:, i] = df[col].to_numpy(dtype="float64", na_value=np.nan)
+    return x
+
+
+def _skew_kurt(n, m2, m3, m4):
+    """Sample skewness and excess kurtosis (pandas' bias-corrected definitions).
+
+    ``m2``..``m4`` are the central moment *sums* ``sum((x - mean) ** k)``.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = m2 / n
+        g1 = (m3 / n) / var ** 1.5
+        g2 = (m4 / n) / var ** 2 - 3
+        skew = np.where(n > 2, np.sqrt(n * (n - 1)) / (n - 2) * g1, np.nan)
+        kurt = np.where(n > 3, (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * g2 + 6), np.nan)
+    # Constant columns: pandas reports 0 rather than NaN
+    skew = np.where((n > 2) & (m2 == 0), 0.0, skew)
+    kurt = np.where((n > 3) & (m2 == 0), 0.0, kurt)
+    return skew, kurt
+
+
+def _fences(q1, q3, factor=IQR_FACTOR):
+    iqr = q3 - q1
+    return q1 - factor * iqr, q3 + factor * iqr
+
+
+def _describe_frame(columns, count, mean, std, minimum, q1, median, q3, maximum, skew, kurt):
+    return pd.DataFrame({
+        "count": count, "mean": mean, "std": std, "min": minimum, "25%": q1, "50%": median,
+        "75%": q3, "max": maximum, "skewness": skew, "kurtosis": kurt,
+    }, index=pd.Index(columns))
+
+
+# ---------------------------
+# In memory
+# ---------------------------
+@dataclass
+class Summary:
+    columns: list
+    count: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    min: np.ndarray
+    q1: np.ndarray
+    median: np.ndarray
+    q3: np.ndarray
+    max: np.ndarray
+    skew: np.ndarray
+    kurt: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    mask: np.ndarray
+    corr_matrix: np.ndarray
+
+    def describe(self):
+        """``describe().T`` plus ``skewness`` and ``kurtosis`` columns."""
+        return _describe_frame(self.columns, self.count, self.mean, self.std, self.min, self.q1,
+                               self.median, self.q3, self.max, self.skew, self.kurt)
+
+    @property
+    def bounds(self):
+        return pd.DataFrame({"lower": self.lower, "upper": self.upper}, index=self.columns)
+
+    @property
+    def outlier_counts(self):
+        return pd.Series(self.mask.sum(axis=0), index=self.columns, name="outliers")
+
+    @property
+    def outlier_mask(self):
+        """Boolean frame: True where a value is outside its column's IQR fences."""
+        return pd.DataFrame(self.mask, columns=self.columns)
+
+    @property
+    def corr(self):
+        return pd.DataFrame(self.corr_matrix, index=self.columns, columns=self.columns)
+
+
+def summarize(df, columns=None, factor=IQR_FACTOR):
+    """All statistics of ``columns`` (default: the numeric ones) of ``df``."""
+    columns = list(columns) if columns is not None else numeric_columns(df)
+    x = _matrix(df, columns)
+    m = Moments.of(x)
+    q1, median, q3 = _quartiles(x)
+    skew, kurt = _skew_kurt(m.n, m.m2, m.m3, m.m4)
+    lower, upper = _fences(q1, q3, factor)
+    # NaN compares False: missing values are never outliers
+    mask = (x < lower) | (x > upper)
+    empty = m.n == 0
+    return Summary(
+        columns=columns, count=m.n, mean=np.where(empty, np.nan, m.mean), std=m.std(),
+        min=np.where(empty, np.nan, m.min), q1=q1, median=median, q3=q3,
+        max=np.where(empty, np.nan, m.max), skew=skew, kurt=kurt,
+        lower=lower, upper=upper, mask=mask, corr_matrix=m.corr(),
+    )
+
+
+def _quartiles(x):
+    """Exact ``(q1, median, q3)`` per column (linear interpolation, like pandas)."""
+    out = np.full((3, x.shape[1]), np.nan)
+    for i in range(x.shape[1]):
+        col = x[:, i]
+        col = col[~np.isnan(col)]
+        if len(col):
+            # One partition finds all three
+            out[:, i] = np.quantile(col, [0.25, 0.5, 0.75])
+    return out
+
+
+# ---------------------------
+# Streaming: mergeable state
+# ---------------------------
+class Moments:
+    """Exact count, mean, central moments, extremes and co-moments of columns.
+
+    Each chunk's moments are computed vectorized and folded in with the
+    pairwise update (Welford generalised to batches and higher moments), so
+    instances built on different chunks or processes :meth:`merge` exactly.
+    """
+
+    def __init__(self, width):
+        self.n = np.zeros(width)
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.m3 = np.zeros(width)
+        self.m4 = np.zeros(width)
+        self.min = np.full(width, np.inf)
+        self.max = np.full(width, -np.inf)
+        # Per column pair, over the rows where both are present: row count,
+        # mean of column i (pair_mean[i, j]), sum of squared deviations of
+        # column i (pair_m2[i, j]) and the co-moment (pair_c, symmetric)
+        self.pair_n = np.zeros((width, width))
+        self.pair_mean = np.zeros((width, width))
+        self.pair_m2 = np.zeros((width, width))
+        self.pair_c = np.zeros((width, width))
+
+    @classmethod
+    def of(cls, x):
+        """Moments of one matrix (NaN = missing)."""
+        m = cls(x.shape[1])
+        valid = ~np.isnan(x)
+        complete = valid.all()
+        m.n = np.full(x.shape[1], float(len(x))) if complete else valid.sum(axis=0).astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            m.mean = np.where(m.n > 0, np.nansum(x, axis=0) / m.n, 0.0)
+        d = x - m.mean if complete else np.where(valid, x - m.mean, 0.0)
+        d2 = d * d
+        # M2 is the diagonal of the co-moment product; M3/M4 per column
+        cross = d.T @ d
+        m.m2 = np.diag(cross).copy()
+        m.m3 = np.einsum("ij,ij->j", d2, d)
+        m.m4 = np.einsum("ij,ij->j", d2, d2)
+        # fmin/fmax skip NaN; an all-missing column stays at +/-inf
+        m.min = np.fmin.reduce(x, axis=0, initial=np.inf)
+        m.max = np.fmax.reduce(x, axis=0, initial=-np.inf)
+
+        if complete:
+            m.pair_n = np.full(cross.shape, float(len(x)))
+            m.pair_mean = np.broadcast_to(m.mean[:, None], cross.shape).copy()
+            m.pair_m2 = np.broadcast_to(m.m2[:, None], cross.shape).copy()
+            m.pair_c = cross
+        else:
+            w = valid.astype("float64")
+            m.pair_n = w.T @ w
+            # Sums over shared rows of the column-centred values, then
+            # re-centred on each pair's own means
+            safe = np.where(m.pair_n > 0, m.pair_n, 1)
+            shift = (d.T @ w) / safe
+            m.pair_mean = np.where(m.pair_n > 0, m.mean[:, None] + shift, 0.0)
+            m.pair_m2 = (d2.T @ w) - m.pair_n * shift ** 2
+            m.pair_c = cross - m.pair_n * shift * shift.T
+        return m
+
+    def merge(self, other):
+        """Fold ``other`` into ``self`` (returns ``self``)."""
+        na, nb = self.n, other.n
+        n = na + nb
+        safe = np.where(n > 0, n, 1)
+        delta = other.mean - self.mean
+        m2 = self.m2 + other.m2 + delta ** 2 * na * nb / safe
+        m3 = (self.m3 + other.m3
+              + delta ** 3 * na * nb * (na - nb) / safe ** 2
+              + 3 * delta * (na * other.m2 - nb * self.m2) / safe)
+        m4 = (self.m4 + other.m4
+              + delta ** 4 * na * nb * (na * na - na * nb + nb * nb) / safe ** 3
+              + 6 * delta ** 2 * (na * na * other.m2 + nb * nb * self.m2) / safe ** 2
+              + 4 * delta * (na * other.m3 - nb * self.m3) / safe)
+        self.mean = self.mean + delta * nb / safe
+        self.n, self.m2, self.m3, self.m4 = n, m2, m3, m4
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+        pa, pb = self.pair_n, other.pair_n
+        pn = pa + pb
+        safe = np.where(pn > 0, pn, 1)
+        dm = other.pair_mean - self.pair_mean
+        self.pair_m2 = self.pair_m2 + other.pair_m2 + dm ** 2 * pa * pb / safe
+        self.pair_c = self.pair_c + other.pair_c + dm * dm.T * pa * pb / safe
+        self.pair_mean = self.pair_mean + dm * pb / safe
+        self.pair_n = pn
+        return self
+
+    def std(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+    def corr(self):
+        """Pairwise-complete correlations, as ``DataFrame.corr`` computes them."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.pair_c / np.sqrt(self.pair_m2 * self.pair_m2.T)
+        return np.where(self.pair_n > 1, corr, np.nan)
+
+
+class QuantileSketch:
+    """KLL sketch of one column: mergeable approximate quantiles.
+
+    Level ``h`` holds items that each stand for ``2 ** h`` inputs.  A level
+    over its capacity is sorted and every other item (random offset) is
+    promoted, so memory stays ``O(k log(n / k))`` and two sketches merge by
+    concatenating their levels and compacting again.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically smaller buffers (c = 2/3)
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays at this level
+                keep, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate quantiles ``qs`` (NaN when the sketch is empty)."""
+        qs = np.asarray(qs, dtype="float64")
+        if not self.n:
+            return np.full(qs.shape, np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cum = values[order], np.cumsum(weights[order])
+        # Position of each quantile's rank among the weighted items
+        ranks = qs * (cum[-1] - 1)
+        return values[np.minimum(np.searchsorted(cum, ranks, side="right"), len(values) - 1)]
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_rng"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rng = np.random.default_rng()
+
+
+class StreamingStats:
+    """Moments + one quantile sketch per column, fed a chunk at a time."""
+
+    def __init__(self, columns, k=DEFAULT_K):
+        self.columns = list(columns)
+        self.moments = Moments(len(self.columns))
+        self.sketches = [QuantileSketch(k) for _ in self.columns]
+
+    def update(self, chunk):
+        x = _matrix(chunk, self.columns)
+        if len(x):
+            self.moments.merge(Moments.of(x))
+            for sketch, values in zip(self.sketches, x.T):
+                sketch.update(values)
+        return self
+
+    def merge(self, other):
+        if other.columns != self.columns:
+            raise ValueError("cannot merge statistics of different columns")
+        self.moments.merge(other.moments)
+        for sketch, theirs in zip(self.sketches, other.sketches):
+            sketch.merge(theirs)
+        return self
+
+    def quartiles(self):
+        """``(q1, median, q3)`` arrays, approximate."""
+        q = np.array([sketch.quantiles([0.25, 0.5, 0.75]) for sketch in self.sketches])
+        return q.T if len(q) else np.full((3, 0), np.nan)
+
+    def bounds(self, factor=IQR_FACTOR):
+        q1, _, q3 = self.quartiles()
+        lower, upper = _fences(q1, q3, factor)
+        return pd.DataFrame({"lower": lower, "upper": upper}, index=self.columns)
+
+    def describe(self):
+        m = self.moments
+        q1, median, q3 = self.quartiles()
+        skew, kurt = _skew_kurt(m.n, m.m2, m.m3, m.m4)
+        return _describe_frame(self.columns, m.n, np.where(m.n > 0, m.mean, np.nan), m.std(),
+                               np.where(m.n > 0, m.min, np.nan), q1, median, q3,
+                               np.where(m.n > 0, m.max, np.nan), skew, kurt)
+
+    @property
+    def corr(self):
+        return pd.DataFrame(self.moments.corr(), index=self.columns, columns=self.columns)
+
+
+def outlier_mask(chunk, bounds):
+    """Boolean frame of values outside ``bounds`` (from :meth:`StreamingStats.bounds`)."""
+    x = _matrix(chunk, list(bounds.index))
+    mask = (x < bounds["lower"].to_numpy()) | (x > bounds["upper"].to_numpy())
+    return pd.DataFrame(mask, columns=bounds.index, index=chunk.index)
+
+
+# ---------------------------
+# Streaming over files
+# ---------------------------
+def _file_chunks(path, chunksize, columns=None):
+    from superstore_loader import read_chunks
+
+    if columns is None:
+        # Typed sample to find the numeric columns; only those are parsed
+        columns = numeric_columns(next(read_chunks(path, chunksize=1000), pd.DataFrame()))
+    return columns, read_chunks(path, chunksize=chunksize, usecols=columns)
+
+
+def _stats_of_file(path, columns, chunksize, k):
+    columns, chunks = _file_chunks(path, chunksize, columns)
+    stats = StreamingStats(columns, k)
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats
+
+
+def _outliers_of_file(path, bounds, chunksize):
+    counts = pd.Series(0, index=bounds.index, name="outliers")
+    for chunk in _file_chunks(path, chunksize, list(bounds.index))[1]:
+        counts += outlier_mask(chunk, bounds).sum()
+    return counts
+
+
+def _map_files(fn, paths, workers, *args):
+    paths = list(paths)
+    workers = workers or min(len(paths), os.cpu_count() or 1)
+    if workers <= 1 or len(paths) == 1:
+        return [fn(path, *args) for path in paths]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(fn, paths, *([arg] * len(paths) for arg in args)))
+
+
+def stream_summary(paths, columns=None, chunksize=None, k=DEFAULT_K, workers=None):
+    """Merged :class:`StreamingStats` of CSV exports, one process per file."""
+    from superstore_loader import CHUNK_ROWS
+
+    parts = _map_files(_stats_of_file, paths, workers, columns, chunksize or CHUNK_ROWS, k)
+    if not parts:
+        raise ValueError("no files given")
+    total = parts[0]
+    for part in parts[1:]:
+        total.merge(part)
+    return total
+
+
+def stream_outlier_counts(paths, bounds, chunksize=None, workers=None):
+    """Second pass: values outside ``bounds`` per column, over all files."""
+    from superstore_loader import CHUNK_ROWS
+
+    return sum(_map_files(_outliers_of_file, paths, workers, bounds, chunksize or CHUNK_ROWS))
@@ -0,0 +1,281 @@
+"""
+CPU-optimised export backends for the detectors.
+
+Each ``.pt`` model can be exported once to ONNX, INT8-quantised ONNX or
+OpenVINO.  Artifacts are cached next to the weights and re-exported only when
+the weights change.  Before a backend is trusted it is compared with the
+``.pt`` model on a sample image set: the ``.pt`` detections act as ground
+truth, and the backend is refused if its AP50 or box agreement (F1 of
+class-matched boxes at IoU 0.5) drops below the thresholds.  Parity and
+latency numbers are stored in a ``<weights>.backends.json`` sidecar.
+
+At load time the registry calls :func:`select_artifact`, which picks the
+fastest accepted backend (or the one forced by ``DETECTOR_BACKEND``) and
+falls back to the ``.pt`` weights otherwise.
+
+    python export_backends.py --model fruit --backends onnx onnx-int8 --samples samples/
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from batching import IMAGE_EXTENSIONS, decode_image
+from detections import Detections, iou_matrix
+
+BACKENDS = ("onnx", "onnx-int8", "openvino")
+DEFAULT_MIN_AP50 = 0.90
+DEFAULT_MIN_AGREEMENT = 0.90
+PARITY_CONF = 0.25
+
+
+# ---------------------------
+# Artifacts
+# ---------------------------
+def artifact_path(weights, backend):
+    stem = os.path.splitext(weights)[0]
+    return {
+        "onnx": stem + ".onnx",
+        "onnx-int8": stem + ".int8.onnx",
+        "openvino": stem + "_openvino_model",
+    }[backend]
+
+
+def sidecar_path(weights):
+    return weights + ".backends.json"
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+
+
+def is_fresh(weights, backend):
+    """The artifact exists and is newer than the weights it came from."""
+    path = artifact_path(weights, backend)
+    return os.path.exists(path) and _mtime(path) >= _mtime(weights)
+
+
+def backend_available(backend):
+    try:
+        if backend.startswith("onnx"):
+            import onnxruntime  # noqa: F401
+        elif backend == "openvino":
+            import openvino  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export(weights, backend, imgsz=640):
+    """Export ``weights`` to ``backend`` unless a fresh artifact exists."""
+    from ultralytics import YOLO
+
+    target = artifact_path(weights, backend)
+    if is_fresh(weights, backend):
+        return target
+
+    if backend == "onnx":
+        # Dynamic axes so the apps can send mini-batches and any image size
+        YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    elif backend == "onnx-int8":
+        _quantize_onnx(export(weights, "onnx", imgsz), target)
+    elif backend == "openvino":
+        YOLO(weights).export(format="openvino", imgsz=imgsz, dynamic=True)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if not os.path.exists(target):
+        raise RuntimeError(f"Export to {backend} did not produce {target}")
+    return target
+
+
+def _quantize_onnx(src, dst):
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+    # Keep the class names / stride metadata ultralytics reads back
+    source, quantized = onnx.load(src), onnx.load(dst)
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, dst)
+
+
+# ---------------------------
+# Parity against the .pt model
+# ---------------------------
+def load_samples(sample_dir, limit=50):
+    paths = sorted(
+        p for p in glob.glob(os.path.join(sample_dir, "**", "*"), recursive=True)
+        if p.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            img = decode_image(f.read())
+        if img is not None:
+            images.append(img)
+    return images
+
+
+def _run(model, images, imgsz):
+    dets, times = [], []
+    for img in images:
+        t0 = time.perf_counter()
+        result = model(img, conf=PARITY_CONF, imgsz=imgsz, verbose=False)[0]
+        times.append(time.perf_counter() - t0)
+        dets.append(Detections.from_result(result))
+    # First call includes graph setup; keep it out of the latency
+    latency = float(np.median(times[1:] if len(times) > 1 else times)) * 1000
+    return dets, latency
+
+
+def _match(ref, cand, iou_threshold=0.5):
+    """Greedy class-aware matching; returns a true-positive flag per candidate box."""
+    tp = np.zeros(len(cand), bool)
+    if len(ref) == 0 or len(cand) == 0:
+        return tp
+    ious = iou_matrix(cand.xyxy, ref.xyxy)
+    ious[cand.cls[:, None] != ref.cls[None, :]] = 0
+    used = np.zeros(len(ref), bool)
+    for ci in np.argsort(-cand.conf):
+        candidates = np.where(~used & (ious[ci] >= iou_threshold))[0]
+        if len(candidates):
+            best = candidates[np.argmax(ious[ci, candidates])]
+            used[best] = True
+            tp[ci] = True
+    return tp
+
+
+def parity_metrics(ref_dets, cand_dets):
+    """AP50 and F1 agreement of ``cand_dets`` using ``ref_dets`` as ground truth."""
+    confs, flags, n_ref = [], [], 0
+    for ref, cand in zip(ref_dets, cand_dets):
+        flags.append(_match(ref, cand))
+        confs.append(cand.conf)
+        n_ref += len(ref)
+    confs = np.concatenate(confs) if confs else np.zeros(0)
+    flags = np.concatenate(flags) if flags else np.zeros(0, bool)
+    if n_ref == 0:
+        # Nothing to agree on: only a backend that also finds nothing passes
+        perfect = float(len(confs) == 0)
+        return {"ap50": perfect, "agreement": perfect, "reference_boxes": 0}
+
+    order = np.argsort(-confs)
+    tp = np.cumsum(flags[order])
+    fp = np.cumsum(~flags[order])
+    recall = tp / n_ref
+    precision = tp / np.maximum(tp + fp, 1)
+    # All-points interpolated AP
+    r = np.concatenate([[0.0], recall, [1.0]])
+    p = np.concatenate([[1.0], precision, [0.0]])
+    p = np.maximum.accumulate(p[::-1])[::-1]
+    ap = float(np.sum((r[1:] - r[:-1]) * p[1:]))
+
+    matched = int(flags.sum())
+    agreement = 2 * matched / (n_ref + len(confs))
+    return {"ap50": round(ap, 4), "agreement": round(agreement, 4), "reference_boxes": n_ref}
+
+
+def check_backends(weights, backends, sample_dir, imgsz=640,
+                   min_ap50=DEFAULT_MIN_AP50, min_agreement=DEFAULT_MIN_AGREEMENT):
+    """Export, compare and record every backend in ``backends``; returns the sidecar."""
+    from ultralytics import YOLO
+
+    images = load_samples(sample_dir)
+    if not images:
+        raise FileNotFoundError(f"No sample images found in '{sample_dir}'")
+
+    ref_dets, pt_latency = _run(YOLO(weights), images, imgsz)
+    report = {
+        "weights_mtime_ns": _mtime(weights),
+        "samples": len(images),
+        "imgsz": imgsz,
+        "backends": {"pt": {"artifact": weights, "latency_ms": round(pt_latency, 2), "accepted": True}},
+    }
+    for backend in backends:
+        entry = {"accepted": False}
+        if not backend_available(backend):
+            entry["reason"] = "runtime not installed"
+        else:
+            try:
+                artifact = export(weights, backend, imgsz)
+                dets, latency = _run(YOLO(artifact, task="detect"), images, imgsz)
+                entry.update(parity_metrics(ref_dets, dets))
+                entry.update(artifact=artifact, latency_ms=round(latency, 2))
+                entry["accepted"] = entry["ap50"] >= min_ap50 and entry["agreement"] >= min_agreement
+                if not entry["accepted"]:
+                    entry["reason"] = "accuracy drift past threshold"
+            except Exception as e:
+                entry["reason"] = f"export failed: {e}"
+        report["backends"][backend] = entry
+
+    with open(sidecar_path(weights), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+# ---------------------------
+# Load-time selection
+# ---------------------------
+def select_artifact(weights, backend="auto"):
+    """Path the registry should load for ``weights`` under ``backend``.
+
+    ``auto`` picks the fastest backend that passed parity for the current
+    weights; a named backend is used only if it passed.  Anything else (no
+    sidecar, stale artifacts, missing runtime) falls back to ``weights``.
+    """
+    if backend == "pt" or not os.path.exists(sidecar_path(weights)):
+        return weights
+    try:
+        with open(sidecar_path(weights)) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return weights
+    if report.get("weights_mtime_ns") != _mtime(weights):
+        return weights
+
+    usable = {
+        name: entry for name, entry in report.get("backends", {}).items()
+        if entry.get("accepted") and (name == "pt" or
+                                      (is_fresh(weights, name) and backend_available(name)))
+    }
+    if backend != "auto":
+        return usable[backend]["artifact"] if backend in usable else weights
+    if not usable:
+        return weights
+    fastest = min(usable, key=lambda name: usable[name].get("latency_ms", float("inf")))
+    return usable[fastest]["artifact"]
+
+
+def main(argv=None):
+    from detector_registry import DETECTORS, resolve_weights
+
+    parser = argparse.ArgumentParser(description="Export detectors to CPU backends and check parity")
+    parser.add_argument("--model", choices=sorted(DETECTORS), required=True)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["onnx", "onnx-int8"])
+    parser.add_argument("--samples", default=os.environ.get("PARITY_SAMPLES_DIR", "samples"))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--min-ap50", type=float, default=DEFAULT_MIN_AP50)
+    parser.add_argument("--min-agreement", type=float, default=DEFAULT_MIN_AGREEMENT)
+    args = parser.parse_args(argv)
+
+    weights = resolve_weights(DETECTORS[args.model])
+    report = check_backends(weights, args.backends, args.samples, args.imgsz,
+                            args.min_ap50, args.min_agreement)
+    for name, entry in report["backends"].items():
+        status = "OK " if entry["accepted"] else "NO "
+        detail = entry.get("reason", "")
+        metrics = ", ".join(f"{k}={entry[k]}" for k in ("latency_ms", "ap50", "agreement") if k in entry)
+        print(f"{status} {name:10s} {metrics} {detail}")
+    print(f"selected: {select_artifact(weights)}")
+    return 0 if any(e["accepted"] for n, e in report["backends"].items() if n != "pt") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
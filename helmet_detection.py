@@ -1,9 +1,13 @@
 import streamlit as st
-from ultralytics import YOLO
-import numpy as np
-import cv2
-from PIL import Image
-import os
+
+from box_renderer import BoxRenderer, fixed_color
+from cascade import is_violation, run_cascade
+from detector_registry import DETECTORS, resolve_weights
+from image_io import decode_upload, upload_buffer
+from instrumentation import show_trace, start_request
+from previews import download_full, show_preview
+from result_cache import cached_detect, digest_bytes
+from warmup import mark, show_readiness, start_warmup, wait_ready
 
 # ---------------------------
 # Page Config
@@ -18,21 +22,35 @@ st.title("🪖 Helmet / No Helmet Detection")
 st.write("Upload an image to detect **Helmet** or **No Helmet**")
 
 # ---------------------------
-# Load YOLO Model
+# Load YOLO Model (shared registry, falls back to best.pt; loaded + warmed up
+# in the background)
 # ---------------------------
-MODEL_PATH = "helmet_best.pt"
+try:
+    resolve_weights(DETECTORS["helmet"])
+except FileNotFoundError:
+    st.error(f"❌ '{DETECTORS['helmet'].weights}' model file is missing!")
+    st.stop()
+
+
+def helmet_colors(cls_id, label):
+    # Define colors based on class (in BGR)
+    # "Helmet" -> Cyan (255, 255, 0)
+    # "No_helmet" -> Red (0, 0, 255)
+    if is_violation(label):
+        return (0, 0, 255), (255, 255, 255)
+    return (255, 255, 0), (0, 0, 0)
 
-@st.cache_resource
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        # Fallback to best.pt if helmet_best.pt is missing
-        if os.path.exists("best.pt"):
-            return YOLO("best.pt")
-        st.error(f"❌ '{MODEL_PATH}' model file is missing!")
-        st.stop()
-    return YOLO(MODEL_PATH)
 
-model = load_model()
+# The violator -> plate cascade needs the license plate model too
+try:
+    resolve_weights(DETECTORS["license"])
+    plates_available = True
+except FileNotFoundError:
+    plates_available = False
+
+# The plate model is only loaded once plate reading is asked for
+start_warmup(["helmet"])
+show_readiness(["helmet"])
 
 # ---------------------------
 # Image Upload
@@ -44,65 +62,94 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     try:
-        # Open the uploaded image
-        image = Image.open(uploaded_file).convert("RGB")
-        st.image(image, caption="Uploaded Image", use_container_width=True)
+        # Timed from decode; recorded only when a detection actually runs
+        trace = start_request("helmet")
+        # Decode straight from the upload buffer into one BGR array
+        with trace.stage("decode"):
+            img = decode_upload(uploaded_file)
+        if img is None:
+            raise ValueError("Unsupported or corrupted image file")
+        with trace.stage("hash"):
+            image_digest = digest_bytes(upload_buffer(uploaded_file))
+        # A display-sized JPEG, encoded once per upload
+        with trace.stage("display"):
+            show_preview(st, img, image_digest, caption="Uploaded Image")
+
+        read_plates = plates_available and st.checkbox(
+            "🚔 Read license plates of riders without helmet"
+        )
+        if read_plates:
+            # Starts loading while the user reaches for the button
+            start_warmup(["license"])
 
         if st.button("🔍 Detect Helmet"):
             with st.spinner("Detecting Helmet..."):
-                # Convert the uploaded image to numpy array (RGB)
-                img_np = np.array(image)
-                
-                # Run YOLO model for detection
-                results = model(img_np, conf=0.4)
-
-                # Create a copy for custom drawing
-                annotated_img = img_np.copy()
-
-                # Process each detection
-                for result in results[0].boxes:
-                    # Get coordinates, class, and confidence
-                    x1, y1, x2, y2 = map(int, result.xyxy[0])
-                    cls_id = int(result.cls[0])
-                    conf = float(result.conf[0])
-                    label_name = model.names[cls_id]
-                    
-                    # Define colors based on class (in RGB)
-                    # "Helmet" -> Cyan (0, 255, 255)
-                    # "No_helmet" -> Red (255, 0, 0)
-                    if "no" in label_name.lower():
-                        box_color = (255, 0, 0)  # Red
-                        text_color = (255, 255, 255)
-                    else:
-                        box_color = (0, 255, 255) # Cyan
-                        text_color = (0, 0, 0)
-
-                    # 1. Draw Bounding Box
-                    cv2.rectangle(annotated_img, (x1, y1), (x2, y2), box_color, 3)
-
-                    # 2. Draw Label Background (Filled box)
-                    label_text = f"{label_name.replace('_', ' ')} {conf:.2f}"
-                    font = cv2.FONT_HERSHEY_SIMPLEX
-                    font_scale = 0.8
-                    thickness = 2
-                    (text_w, text_h), baseline = cv2.getTextSize(label_text, font, font_scale, thickness)
-                    
-                    # Ensure label background is within image bounds
-                    bg_y1 = max(0, y1 - text_h - 10)
-                    cv2.rectangle(annotated_img, (x1, bg_y1), (x1 + text_h + text_w, y1), box_color, -1)
-
-                    # 3. Draw Label Text
-                    cv2.putText(annotated_img, label_text, (x1 + 5, y1 - 7), 
-                                font, font_scale, text_color, thickness)
+                with trace.stage("model_wait"):
+                    model = wait_ready("helmet")
+                renderer = BoxRenderer(
+                    names={k: v.replace("_", " ") for k, v in model.names.items()},
+                    colors=helmet_colors,
+                    box_thickness=3,
+                    font_scale=0.8,
+                )
+                # Run YOLO model for detection (cached per image content)
+                with trace.stage("detect"):
+                    dets = cached_detect(model, img, image_digest)
+                dets = dets.filter(0.4)
+
+                cascade = None
+                drawn = f"{model.identity}|0.4"
+                if read_plates:
+                    # Plate model only sees crops around violators
+                    with trace.stage("cascade"):
+                        plate_model = wait_ready("license")
+                        cascade = run_cascade(dets, model.names, plate_model, img)
+                    drawn += f"|{plate_model.identity}"
+                    plate_crops = [
+                        img[int(p["plate_box"][1]):int(p["plate_box"][3]),
+                            int(p["plate_box"][0]):int(p["plate_box"][2])].copy()
+                        if p["plate_box"] else None
+                        for p in cascade.pairs
+                    ]
+
+                # The original is already on screen, so draw in place
+                with trace.stage("draw"):
+                    renderer.render(img, dets, out=img)
+                    if cascade is not None:
+                        BoxRenderer(
+                            names=plate_model.names,
+                            colors=fixed_color((0, 255, 0)),
+                            label_background=False,
+                        ).render(img, cascade.plates, out=img)
 
             # Show the result with annotated image
             st.success("✅ Detection Complete")
-            st.image(
-                annotated_img,
-                caption="Helmet Detection Result",
-                use_container_width=True
-            )
+            with trace.stage("display"):
+                show_preview(st, img, image_digest, drawn, caption="Helmet Detection Result")
+            download_full(st, img, f"helmet_{uploaded_file.name}")
+            mark("first_detection")
+            show_trace(trace.finish())
+
+            if cascade is not None:
+                st.subheader(f"🚔 Violators: {len(cascade.pairs)}")
+                c1, c2 = st.columns(2)
+                c1.metric("Plate model compute saved", f"{cascade.compute_saved:.0%}")
+                c2.metric("Both models, compute saved", f"{cascade.total_saved:.0%}")
+                st.caption(
+                    f"{cascade.crops_run} violator crops at {cascade.crop_imgsz}px "
+                    "instead of a full-frame plate pass"
+                )
+                for i, (pair, crop) in enumerate(zip(cascade.pairs, plate_crops), start=1):
+                    p1, p2 = st.columns([1, 2])
+                    if crop is not None and crop.size:
+                        p1.image(crop, channels="BGR", use_container_width=True)
+                        p2.write(f"**Violator #{i}** ({pair['violator_conf']:.2f}) · "
+                                 f"plate {pair['plate_conf']:.2f}")
+                    else:
+                        p2.write(f"**Violator #{i}** ({pair['violator_conf']:.2f}) · no plate found")
 
     except Exception as e:
         st.error("❌ Error processing the image")
         st.code(str(e))
+
+mark("interactive")
@@ -0,0 +1,142 @@
+"""
+Zero-copy ingest from uploaded bytes to a BGR model input.
+
+``decode_upload`` hands the upload's own buffer (a memoryview, no copy) to
+``cv2.imdecode``, applies the JPEG EXIF orientation, and returns one BGR
+array.  That array goes to the model as-is and the apps draw on it in place,
+so a request makes one full-frame array instead of the
+PIL -> NumPy -> BGR -> copy -> RGB chain.
+
+With ``max_side`` (or ``DECODE_MAX_SIDE``) large JPEGs are decoded directly
+at 1/2, 1/4 or 1/8 scale by libjpeg, which is much cheaper than decoding at
+full size and resizing.
+"""
+
+import os
+import struct
+
+import cv2
+import numpy as np
+
+_REDUCED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def upload_buffer(uploaded):
+    """A zero-copy view of an uploaded file's bytes."""
+    if hasattr(uploaded, "getbuffer"):
+        return uploaded.getbuffer()
+    return memoryview(uploaded)
+
+
+# ---------------------------
+# Header probing (no decode)
+# ---------------------------
+def _jpeg_segments(buf):
+    """Yield ``(marker, payload_offset, payload_length)`` up to the image data."""
+    if bytes(buf[:2]) != b"\xff\xd8":
+        return
+    pos, n = 2, len(buf)
+    while pos + 4 <= n:
+        if buf[pos] != 0xFF:
+            return
+        marker = buf[pos + 1]
+        if marker == 0xD9 or marker == 0xDA:  # end of image / start of scan
+            return
+        length = struct.unpack(">H", bytes(buf[pos + 2:pos + 4]))[0]
+        yield marker, pos + 4, length - 2
+        pos += 2 + length
+
+
+def probe_size(buf):
+    """``(width, height)`` from a JPEG/PNG header, or ``None``."""
+    if bytes(buf[:8]) == b"\x89PNG\r\n\x1a\n":
+        w, h = struct.unpack(">II", bytes(buf[16:24]))
+        return w, h
+    for marker, offset, _ in _jpeg_segments(buf):
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack(">HH", bytes(buf[offset + 1:offset + 5]))
+            return w, h
+    return None
+
+
+def exif_orientation(buf):
+    """EXIF orientation tag (1-8) of a JPEG, 1 if absent."""
+    for marker, offset, length in _jpeg_segments(buf):
+        if marker != 0xE1 or bytes(buf[offset:offset + 6]) != b"Exif\x00\x00":
+            continue
+        tiff = bytes(buf[offset + 6:offset + length])
+        if len(tiff) < 8:
+            return 1
+        endian = "<" if tiff[:2] == b"II" else ">"
+        ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+        if ifd + 2 > len(tiff):
+            return 1
+        count = struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]
+        for i in range(count):
+            entry = ifd + 2 + 12 * i
+            if entry + 12 > len(tiff):
+                break
+            tag = struct.unpack(endian + "H", tiff[entry:entry + 2])[0]
+            if tag == 0x0112:
+                value = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+                return value if 1 <= value <= 8 else 1
+        return 1
+    return 1
+
+
+def apply_orientation(img, orientation):
+    """Rotate/flip ``img`` upright for an EXIF orientation value."""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def _reduction(buf, max_side):
+    if not max_side:
+        return 1
+    size = probe_size(buf)
+    if size is None:
+        return 1
+    longest = max(size)
+    factor = 1
+    while factor < 8 and longest // (factor * 2) >= max_side:
+        factor *= 2
+    return factor
+
+
+# ---------------------------
+# Decode
+# ---------------------------
+def decode_buffer(buf, max_side=None):
+    """Decode encoded image bytes (any buffer) into an upright BGR array.
+
+    ``max_side`` allows a reduced-resolution decode whose longest side stays
+    at or above it.  Returns ``None`` if the bytes are not a readable image.
+    """
+    if max_side is None:
+        max_side = int(os.environ.get("DECODE_MAX_SIDE", 0))
+    # OpenCV's own EXIF handling differs between versions; do it explicitly
+    flags = _REDUCED[_reduction(buf, max_side)] | cv2.IMREAD_IGNORE_ORIENTATION
+    img = cv2.imdecode(np.frombuffer(buf, np.uint8), flags)
+    if img is None:
+        return None
+    return apply_orientation(img, exif_orientation(buf))
+
+
+def decode_upload(uploaded, max_side=None):
+    """Decode a Streamlit upload straight from its buffer; see :func:`decode_buffer`."""
+    return decode_buffer(upload_buffer(uploaded), max_side)
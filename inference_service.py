@@ -0,0 +1,370 @@
+"""
+Local asyncio inference service with dynamic micro-batching.
+
+Streamlit runs every session on its own thread, so busy sessions queue up on
+one model one image at a time while the other cores idle.  This service owns
+the models instead (loaded through the shared registry) and gathers the
+images of concurrent requests into micro-batches:
+
+    python inference_service.py --port 8765 --preload mask fruit
+    INFERENCE_SERVICE=127.0.0.1:8765 streamlit run mask_detection.py
+
+Per ``(model, imgsz)`` a batcher takes the first queued image, waits at most
+``--window-ms`` for more (up to ``--max-batch``), and runs them as one
+forward pass on that model's own worker thread; images large enough for
+tiling are detected one by one with :func:`tiled_inference.detect_auto`.
+The queue is bounded (``--queue-size``): a request that does not fit is
+answered ``busy`` right away and the client backs off and retries, so
+overload shows up as latency at the edge instead of an ever-growing backlog.
+
+With ``INFERENCE_SERVICE`` set, :func:`detector_registry.load_detector`
+returns a :class:`RemoteDetector`.  It is called like a registry
+:class:`~detector_registry.Detector` but returns :class:`Detections`, which
+every caller already accepts through ``Detections.from_result``.
+
+Wire format (both directions): a 4-byte big-endian header length, a JSON
+header, then ``header["nbytes"]`` bytes of payload — raw ``uint8`` images
+on the way in, ``float32`` ``x1, y1, x2, y2, conf, cls`` rows on the way out.
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from detections import Detections
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 8
+DEFAULT_WINDOW_MS = 10.0
+DEFAULT_QUEUE_SIZE = 64
+_HEADER = struct.Struct(">I")
+
+
+class ServiceBusy(RuntimeError):
+    """The service queue stayed full through every retry."""
+
+
+class ServiceError(RuntimeError):
+    """The service answered a request with an error."""
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port or DEFAULT_PORT)
+
+
+# ---------------------------
+# Server
+# ---------------------------
+class MicroBatcher:
+    """Bounded queue of images for one ``(model, imgsz)`` and its batching loop."""
+
+    def __init__(self, name, imgsz, executor, max_batch, window, queue_size):
+        self.name = name
+        self.imgsz = imgsz
+        self.executor = executor
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = asyncio.Queue(queue_size)
+        self.batches = 0
+        self.images = 0
+
+    def free(self):
+        return self.queue.maxsize - self.queue.qsize()
+
+    def submit(self, img, conf):
+        """Queue one image; the caller has checked :meth:`free` first."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put_nowait((img, conf, future, loop.time()))
+        return future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                while len(batch) < self.max_batch and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                remaining = deadline - loop.time()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, 0.001))
+
+            started = loop.time()
+            # The lowest threshold of the batch, each caller's own applied after
+            conf = min(item[1] for item in batch)
+            try:
+                outputs = await loop.run_in_executor(
+                    self.executor, self._infer, [item[0] for item in batch], conf)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            per_image = (loop.time() - started) / len(batch)
+            self.batches += 1
+            self.images += len(batch)
+            for (_, img_conf, future, queued), dets in zip(batch, outputs):
+                if not future.done():
+                    future.set_result((dets.filter(img_conf), started - queued, per_image))
+
+    def _infer(self, images, conf):
+        from detector_registry import get_registry
+        from tiled_inference import detect_auto, should_tile
+
+        detector = get_registry().load(self.name)
+        out = [None] * len(images)
+        for i, img in enumerate(images):
+            if should_tile(img):
+                out[i] = detect_auto(detector, img, conf=conf, imgsz=self.imgsz)
+        single = [i for i, dets in enumerate(out) if dets is None]
+        if single:
+            kwargs = {"conf": conf, "verbose": False}
+            if self.imgsz is not None:
+                kwargs["imgsz"] = self.imgsz
+            results = detector([images[i] for i in single], **kwargs)
+            for i, result in zip(single, results):
+                out[i] = Detections.from_result(result)
+        return out
+
+
+class InferenceService:
+    """Models, their worker threads and batchers, and the request handler."""
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, window_ms=DEFAULT_WINDOW_MS,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.queue_size = queue_size
+        # ultralytics predictors are not thread-safe: one worker thread per model
+        self._executors = {}
+        self._batchers = {}
+        self._tasks = []
+        self._loaded = set()
+        self.busy_replies = 0
+
+    def executor(self, name):
+        if name not in self._executors:
+            self._executors[name] = ThreadPoolExecutor(1, thread_name_prefix=f"infer-{name}")
+        return self._executors[name]
+
+    def batcher(self, name, imgsz):
+        key = (name, imgsz)
+        if key not in self._batchers:
+            self._batchers[key] = MicroBatcher(name, imgsz, self.executor(name), self.max_batch,
+                                               self.window, self.queue_size)
+            self._tasks.append(asyncio.get_running_loop().create_task(self._batchers[key].run()))
+        return self._batchers[key]
+
+    async def load(self, name):
+        from detector_registry import DETECTORS, get_registry
+
+        if name not in DETECTORS:
+            raise KeyError(f"unknown model '{name}'")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor(name), get_registry().load, name)
+
+    async def handle(self, header, payload):
+        op = header.get("op")
+        if op == "info":
+            detector = await self.load(header["model"])
+            return {"ok": True, "names": detector.names, "identity": detector.identity,
+                    "path": detector.path}, b""
+        if op == "stats":
+            return {"ok": True, "busy_replies": self.busy_replies, "batchers": [
+                {"model": b.name, "imgsz": b.imgsz, "queued": b.queue.qsize(),
+                 "batches": b.batches, "images": b.images,
+                 "mean_batch": round(b.images / b.batches, 2) if b.batches else 0.0}
+                for b in self._batchers.values()
+            ]}, b""
+        if op != "detect":
+            raise ValueError(f"unknown op '{op}'")
+
+        if header["model"] not in self._loaded:
+            await self.load(header["model"])
+            self._loaded.add(header["model"])
+        batcher = self.batcher(header["model"], header.get("imgsz"))
+        shapes = [tuple(s) for s in header["shapes"]]
+        if len(shapes) > self.queue_size:
+            raise ValueError(f"{len(shapes)} images exceed the queue size {self.queue_size}")
+        if batcher.free() < len(shapes):
+            self.busy_replies += 1
+            return {"ok": False, "busy": True}, b""
+
+        futures, offset = [], 0
+        for shape in shapes:
+            size = int(np.prod(shape))
+            img = np.frombuffer(payload, np.uint8, size, offset).reshape(shape)
+            offset += size
+            futures.append(batcher.submit(img, float(header.get("conf", 0.25))))
+        results = await asyncio.gather(*futures)
+
+        arrays = [dets.to_array().astype(np.float32) for dets, _, _ in results]
+        body = np.concatenate(arrays).tobytes() if arrays else b""
+        return {
+            "ok": True,
+            "counts": [len(a) for a in arrays],
+            "queue_ms": [round(q * 1000, 3) for _, q, _ in results],
+            "infer_ms": [round(t * 1000, 3) for _, _, t in results],
+        }, body
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break
+                header = json.loads(await reader.readexactly(length))
+                payload = await reader.readexactly(header.get("nbytes", 0))
+                try:
+                    reply, body = await self.handle(header, payload)
+                except Exception as e:
+                    reply, body = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+                reply["nbytes"] = len(body)
+                data = json.dumps(reply).encode()
+                writer.write(_HEADER.pack(len(data)) + data)
+                if body:
+                    writer.write(body)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, preload=()):
+        for name in preload:
+            await self.load(name)
+        server = await asyncio.start_server(self.serve_client, host, port)
+        print(f"inference service listening on {host}:{port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+# ---------------------------
+# Client
+# ---------------------------
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view, got = memoryview(buf), 0
+    while got < n:
+        chunk = sock.recv_into(view[got:], n - got)
+        if not chunk:
+            raise ConnectionError("inference service closed the connection")
+        got += chunk
+    return buf
+
+
+def request(address, header, payload=(), timeout=120.0):
+    """One round trip; ``payload`` is a sequence of buffers sent back to back."""
+    header = dict(header, nbytes=sum(memoryview(p).nbytes for p in payload))
+    data = json.dumps(header).encode()
+    with socket.create_connection(parse_address(address), timeout=timeout) as sock:
+        sock.sendall(_HEADER.pack(len(data)) + data)
+        for part in payload:
+            sock.sendall(part)
+        (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+        reply = json.loads(_recv_exact(sock, length))
+        body = _recv_exact(sock, reply.get("nbytes", 0))
+    return reply, body
+
+
+class RemoteDetector:
+    """Client stand-in for a registry ``Detector`` backed by the service."""
+
+    remote = True
+
+    def __init__(self, name, address, retries=6, backoff=0.05):
+        self.name = name
+        self.address = address
+        self.retries = retries
+        self.backoff = backoff
+        self.nbytes = 0
+        try:
+            info, _ = request(address, {"op": "info", "model": name})
+        except OSError as e:
+            raise ConnectionError(f"inference service at {address} is not reachable: {e}") from e
+        if not info["ok"]:
+            raise ServiceError(info["error"])
+        self._names = {int(k): v for k, v in info["names"].items()}
+        self.identity = info["identity"]
+        self.path = info["path"]
+
+    @property
+    def names(self):
+        return dict(self._names)
+
+    def __call__(self, source, conf=0.25, imgsz=None, **kwargs):
+        """Detect on one BGR array or a list of them; returns a list of :class:`Detections`."""
+        images = list(source) if isinstance(source, (list, tuple)) else [source]
+        images = [np.ascontiguousarray(img, dtype=np.uint8) for img in images]
+        header = {"op": "detect", "model": self.name, "conf": conf, "imgsz": imgsz,
+                  "shapes": [img.shape for img in images]}
+        for attempt in range(self.retries + 1):
+            reply, body = request(self.address, header, [img.data for img in images])
+            if not reply.get("busy"):
+                break
+            if attempt == self.retries:
+                raise ServiceBusy(f"inference service at {self.address} is overloaded")
+            time.sleep(self.backoff * 2 ** attempt)
+        if not reply["ok"]:
+            raise ServiceError(reply["error"])
+
+        from instrumentation import current_trace
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add("service.queue", sum(reply["queue_ms"]) / 1000)
+            trace.add("service.inference", sum(reply["infer_ms"]) / 1000)
+
+        rows = np.frombuffer(body, np.float32).reshape(-1, 6)
+        out, start = [], 0
+        for count in reply["counts"]:
+            out.append(Detections.from_array(rows[start:start + count]))
+            start += count
+        return out
+
+
+_remote = {}
+_remote_lock = threading.Lock()
+
+
+def remote_detector(name, address):
+    """One shared :class:`RemoteDetector` per model and service address."""
+    with _remote_lock:
+        if (name, address) not in _remote:
+            _remote[(name, address)] = RemoteDetector(name, address)
+        return _remote[(name, address)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the detectors with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--window-ms", type=float, default=DEFAULT_WINDOW_MS,
+                        help="how long the first image of a batch waits for company")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="queued images per model before answering busy")
+    parser.add_argument("--preload", nargs="*", default=[], help="models to load at start-up")
+    args = parser.parse_args(argv)
+
+    service = InferenceService(args.max_batch, args.window_ms, args.queue_size)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.preload))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
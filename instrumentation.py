@@ -0,0 +1,277 @@
+"""
+Per-stage timing for detection requests.
+
+Every app request gets a :class:`RequestTrace`; each step runs inside
+``trace.stage(name)``, which is two ``perf_counter`` calls.  While a trace is
+active, the registry's :class:`~detector_registry.Detector` also records
+ultralytics' own preprocess / inference / postprocess split for every model
+call, nested under the stage that made the call.
+
+Finished traces feed process-wide histograms, one per ``(app, stage)``:
+
+* cumulative Prometheus histograms (``detection_stage_seconds``), written as
+  Prometheus text to ``METRICS_FILE`` after every request (textfile collector
+  style; give each app process its own file) and/or served on
+  ``http://0.0.0.0:METRICS_PORT/metrics``;
+* a rolling window of the last ``METRICS_WINDOW`` (default 500) timings per
+  stage, for the p50 / p95 shown in the sidebar.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Prometheus histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_WINDOW = 500
+
+_current = contextvars.ContextVar("detection_trace", default=None)
+
+
+class RequestTrace:
+    """Stage timings of one request, in the order the stages first ran."""
+
+    def __init__(self, app):
+        self.app = app
+        self.started = time.perf_counter()
+        self.finished = None
+        # name -> [seconds, depth]; a repeated stage accumulates
+        self.stages = {}
+        self._depth = 0
+        self._token = _current.set(self)
+
+    @contextmanager
+    def stage(self, name):
+        # Registered on entry so a stage is listed before what it contains
+        entry = self.stages.setdefault(name, [0.0, self._depth])
+        self._depth += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            entry[0] += time.perf_counter() - t0
+
+    def add(self, name, seconds):
+        """Add time measured elsewhere, nested under the running stage."""
+        self.stages.setdefault(name, [0.0, self._depth])[0] += seconds
+
+    def add_model_speed(self, results):
+        """Add ultralytics' per-image ``speed`` (ms) of a model call's results."""
+        for result in results:
+            for part, ms in (getattr(result, "speed", None) or {}).items():
+                if ms is not None:
+                    self.add(f"model.{part}", ms / 1000)
+
+    @property
+    def total(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def rows(self):
+        """``(stage, ms, share of total)`` rows; nested stages are indented."""
+        total = self.total or 1e-9
+        rows = [("  " * depth + name, seconds * 1000, seconds / total)
+                for name, (seconds, depth) in self.stages.items()]
+        accounted = sum(seconds for seconds, depth in self.stages.values() if depth == 0)
+        rows.append(("(other)", max(total - accounted, 0.0) * 1000, max(total - accounted, 0.0) / total))
+        return rows
+
+    def finish(self):
+        """Stop the clock and record every stage into the shared metrics."""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Finished from another context; just stop being current there
+                _current.set(None)
+            get_metrics().record(self)
+        return self
+
+
+def start_request(app):
+    """Begin timing a request of ``app``; it is current until :meth:`finish`."""
+    return RequestTrace(app)
+
+
+def current_trace():
+    """The trace of the request running in this context, or ``None``."""
+    return _current.get()
+
+
+# ---------------------------
+# Histograms
+# ---------------------------
+class Histogram:
+    """Cumulative Prometheus buckets plus a rolling window of recent values."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def cumulative(self):
+        running, out = 0, []
+        for c in self.counts:
+            running += c
+            out.append(running)
+        return out
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Histograms per ``(app, stage)`` and request counts per app."""
+
+    def __init__(self, window=None):
+        if window is None:
+            window = int(os.environ.get("METRICS_WINDOW", DEFAULT_WINDOW))
+        self.window = window
+        self.metrics_file = os.environ.get("METRICS_FILE") or None
+        self._histograms = {}
+        self._requests = {}
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        with self._lock:
+            self._requests[trace.app] = self._requests.get(trace.app, 0) + 1
+            for name, (seconds, _) in list(trace.stages.items()) + [("total", (trace.total, 0))]:
+                key = (trace.app, name)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(self.window)
+                self._histograms[key].observe(seconds)
+        if self.metrics_file:
+            self.write(self.metrics_file)
+
+    def summary(self, app):
+        """``(stage, count, p50 ms, p95 ms)`` over the rolling window of ``app``."""
+        with self._lock:
+            return [(stage, len(h.recent), h.quantile(0.5) * 1000, h.quantile(0.95) * 1000)
+                    for (a, stage), h in self._histograms.items() if a == app]
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP detection_requests_total Detection requests handled.",
+            "# TYPE detection_requests_total counter",
+        ]
+        with self._lock:
+            for app, n in sorted(self._requests.items()):
+                lines.append(f'detection_requests_total{{app="{_label(app)}"}} {n}')
+            lines += [
+                "# HELP detection_stage_seconds Time spent per request stage.",
+                "# TYPE detection_stage_seconds histogram",
+            ]
+            for (app, stage), h in sorted(self._histograms.items()):
+                labels = f'app="{_label(app)}",stage="{_label(stage)}"'
+                for bound, c in zip(BUCKETS, h.cumulative()):
+                    lines.append(f'detection_stage_seconds_bucket{{{labels},le="{bound}"}} {c}')
+                lines.append(f'detection_stage_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"detection_stage_seconds_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"detection_stage_seconds_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the Prometheus text to ``path`` atomically."""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """The metrics shared by every app in this process (starts the endpoint)."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+            port = os.environ.get("METRICS_PORT")
+            if port:
+                serve_metrics(int(port))
+        return _metrics
+
+
+# ---------------------------
+# Export endpoint
+# ---------------------------
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve ``/metrics`` from a daemon thread; returns the server or ``None``."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = get_metrics().prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        # Another app process already serves this port
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+
+# ---------------------------
+# Streamlit sidebar
+# ---------------------------
+def show_trace(trace):
+    """Collapsible per-request breakdown and rolling percentiles in the sidebar."""
+    import streamlit as st
+
+    with st.sidebar.expander(f"⏱️ Timing: {trace.total * 1000:.0f} ms", expanded=False):
+        rows = trace.rows()
+        st.table({
+            "Stage": [name for name, _, _ in rows],
+            "ms": [f"{ms:.1f}" for _, ms, _ in rows],
+            "Share": [f"{share:.0%}" for _, _, share in rows],
+        })
+        summary = get_metrics().summary(trace.app)
+        if summary:
+            st.caption(f"Last {get_metrics().window} requests of this app")
+            st.table({
+                "Stage": [stage for stage, _, _, _ in summary],
+                "n": [n for _, n, _, _ in summary],
+                "p50 ms": [f"{p50:.1f}" for _, _, p50, _ in summary],
+                "p95 ms": [f"{p95:.1f}" for _, _, _, p95 in summary],
+            })
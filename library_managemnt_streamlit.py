@@ -1,35 +1,119 @@
+import os
+import tempfile
+
 import streamlit as st
 
+from library_store import FORMATS, LibraryStore
+
 class Library:
-    def __init__(self,listofBooks):
-        self.books = listofBooks
+    def __init__(self, store):
+        # Books, copy counts and loans live in SQLite (see library_store.py),
+        # so they persist across reruns and are shared by every session
+        self.store = store
         
-    def displayAvailableBooks(self):
-            st.write(f"\n{len(self.books)} Available books are: ") 
-            for book in self.books:
-                st.write(f" 📗--{book}") 
-            st.write("\n")
+    def displayAvailableBooks(self, page_size=50):
+            # Only the visible page is read and sent; cursors[i] starts page i
+            st.write(f"\n{self.store.available_count()} Available books are: ") 
+            cursors = st.session_state.setdefault("library_cursors", [None])
+            page = len(cursors) - 1
+            rows, next_cursor = self.store.available_page(page_size, after=cursors[-1])
+            showTable(rows)
+            prev_col, info_col, next_col = st.columns([1, 2, 1])
+            if prev_col.button("⬅️ Previous", disabled=page == 0):
+                cursors.pop()
+                st.rerun()
+            info_col.write(f"Page {page + 1}")
+            if next_col.button("Next ➡️", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
+
+    def searchBooks(self, label="Search by title (partial or misspelled is fine):", key="search"):
+            # live: rerun after a short typing pause, not only on Enter or blur
+            query = st.text_input(label, key=key, type="search", live=True)
+            matches = self.store.search(query) if query else []
+            if query and not matches:
+                st.write(f"No books match '{query}'.")
+            return matches
 
     def borrowBook(self,name, bookname):
-        if bookname not in self.books:
+        if not self.store.borrow(name, bookname):
             st.write(f"sorry, {bookname} is not available in the library else wait untill he returns .\n")
         else:
-            track.append({name: bookname})
             st.write(f'Book ISSUED: Thank you keep it with care and return on time.\n')
-            self.books.remove(bookname)
 
-    def returnBook(self, bookname):
-            st.write("Book returned: Thank you!\n")
-            self.books.append(bookname)
+    def returnBook(self, name, bookname):
+            if self.store.return_book(name, bookname):
+                st.write("Book returned: Thank you!\n")
+            else:
+                st.write(f"No record of {name} borrowing '{bookname}'.\n")
 
     def donateBook(self,bookname):
+            self.store.donate(bookname)
             st.write("Book Donated: Thank you very much, Have a Great day Ahead!\n")
-            self.books.append(bookname)
+
+    def importBooks(self, uploaded):
+            # Streamed from the upload in chunks; each chunk is one transaction
+            fmt = "jsonl" if uploaded.name.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+            bar = st.progress(0.0, text=f"Importing {uploaded.name}…")
+
+            def report(rows, done):
+                fraction = min((done or 0) / max(uploaded.size, 1), 1.0)
+                bar.progress(fraction, text=f"Importing {uploaded.name}: {rows} rows")
+
+            try:
+                added, skipped = self.store.import_catalog(uploaded, fmt, progress=report)
+            except ValueError as e:
+                st.error(f"Could not import {uploaded.name}: {e}")
+                return
+            bar.progress(1.0, text=f"Imported {uploaded.name}")
+            st.success(f"Added {added} books" + (f", skipped {skipped} invalid rows." if skipped else "."))
+
+    def exportBooks(self, fmt="csv"):
+            # The export is only generated when a button is clicked, and spooled
+            # to disk chunk by chunk rather than joined into one string.
+            # Streamlit still reads the finished file into memory to serve it,
+            # so very large catalogs are better exported with the CLI.
+            st.download_button("⬇️ Download catalog", lambda: spoolExport(self.store.export_catalog(fmt)),
+                               file_name=f"catalog.{fmt}", mime="text/plain")
+            st.download_button("⬇️ Download loan history", lambda: spoolExport(self.store.export_loans(fmt)),
+                               file_name=f"loans.{fmt}", mime="text/plain")
+            st.caption("Downloads are held in memory by the server; for large catalogs run "
+                       "`python library_store.py export catalog.csv` instead.")
+
+    def trackBooks(self, name=None, limit=200):
+            loans = self.store.loans(name, limit=limit)
+            if loans:
+                st.write("Currently borrowed books:")
+                for borrower, book, _ in loans:
+                    st.write(f"{borrower} has borrowed '{book}'")
+            else:
+                st.write("No books are currently borrowed.")
+
+def spoolExport(lines):
+    # Unbuffered so Streamlit accepts it as a raw file and reads it from the start
+    f = tempfile.TemporaryFile(buffering=0)
+    for line in lines:
+        f.write(line.encode("utf-8"))
+    f.seek(0)
+    return f
+
+def showTable(rows):
+    st.dataframe(
+        {"📗 Book": [title for title, _, _ in rows],
+         "On shelf": [available for _, _, available in rows],
+         "Copies": [copies for _, copies, _ in rows]},
+        hide_index=True, use_container_width=True,
+    )
 
 class Student:
     
-    def requestBook(self):
-        book = st.text_input("Enter the name of the book you want to borrow:")
+    def requestBook(self, library):
+        # Search, then pick the exact title from the matches
+        matches = library.searchBooks("Search the book you want to borrow:", key="borrow_search")
+        titles = [title for title, _, available in matches if available > 0]
+        if matches and not titles:
+            st.write("All copies of the matching books are borrowed right now.")
+        book = st.selectbox("Select the book:", titles) if titles else ""
         return book
     def returnBook(self):
         name = st.text_input("Enter your name:")
@@ -41,13 +125,22 @@ class Student:
         return book
 
 
+@st.cache_resource
+def get_store():
+    # One store per server process; an empty database is seeded from the
+    # LIBRARY_SEED catalog file (CSV/JSONL) if set, else the starting books
+    seed_file = os.environ.get("LIBRARY_SEED")
+    store = LibraryStore(
+        seed=[] if seed_file else ["Rich Dad Poor Dad","Ego is the Enemy","zero to one","Pyscology of money","48 Laws of Power"]
+    )
+    if seed_file and store.is_empty():
+        store.import_catalog(seed_file)
+    return store
+
 
         # Librart and track setup
-Karachilibrary = Library(
-         ["Rich Dad Poor Dad","Ego is the Enemy","zero to one","Pyscology of money","48 Laws of Power"]
-         )
+Karachilibrary = Library(get_store())
 student = Student()
-track = []
 
 st.title("📚📚📚 WELCOME TO THE KARACHI LIBRARY MANAGEMENT 📚📚📚")
 
@@ -60,16 +153,21 @@ st.write("""
              3. Return a book
              4. Donate a book
              5. Track books
-             6. Exit
+             6. Import / export books
+             7. Exit
     """)
 
-action = st.selectbox("select an action",["","List all books","Borrow a book","Return a book","Donate a book","Track books","Exit"])
+action = st.selectbox("select an action",["","List all books","Borrow a book","Return a book","Donate a book","Track books","Import / export books","Exit"])
     
 if action == "List all books":
-    Karachilibrary.displayAvailableBooks()
+    matches = Karachilibrary.searchBooks()
+    if matches:
+        showTable(matches)
+    else:
+        Karachilibrary.displayAvailableBooks()
 elif action == "Borrow a book":
     student_name = st.text_input("Enter your name:")
-    book_to_borrow = student.requestBook()
+    book_to_borrow = student.requestBook(Karachilibrary)
           
     if st.button("Borrow"):
                  if student_name and book_to_borrow: 
@@ -79,17 +177,17 @@ elif action == "Borrow a book":
                  elif not book_to_borrow:
                     st.warning("Please enter the name of the book you want to borrow.")   
 
-    elif action == "Return a book":  
+elif action == "Return a book":  
          student_name, book_to_return = student.returnBook()
 
          if st.button("Return"):
                   if student_name and book_to_return:
-                        Karachilibrary.returnBook(book_to_return)
+                        Karachilibrary.returnBook(student_name, book_to_return)
                   elif not student_name:
                       st.warning("Please enter your name.") 
                   elif not book_to_return:
                       st.warning("Please enter the name of the book you want to return.")
-    elif action == "Donate a book":
+elif action == "Donate a book":
          book_to_donate = student.donateBook()
 
          if st.button("Donate"):
@@ -98,15 +196,18 @@ elif action == "Borrow a book":
                   else:
                       st.warning("Please enter the name of the book you want to donate.")     
 
-    elif action == "Track books":  
-         if track:
-             st.write("Currently borrowed books:")
-             for entery in track:
-                 for key, value in entery.items():
-                     st.write(f"{key} has borrowed '{value}'")
-         else:
-             st.write("No books are currently borrowed.")      
+elif action == "Track books":  
+         borrower = st.text_input("Borrower name (leave empty for everyone):")
+         Karachilibrary.trackBooks(borrower or None)
+
+elif action == "Import / export books":
+         uploaded = st.file_uploader("Catalog to import (CSV with a 'title' column and optional 'copies', or JSONL):",
+                                     type=["csv", "jsonl", "ndjson", "json"])
+         if st.button("Import", disabled=uploaded is None):
+                  Karachilibrary.importBooks(uploaded)
+         fmt = st.radio("Export format", FORMATS, horizontal=True)
+         Karachilibrary.exportBooks(fmt)
 
 
-    elif action == "Exit":
+elif action == "Exit":
         st.write("Thank you for using the Karachi Library Management System. Have a great day!")                                        
\ No newline at end of file
@@ -0,0 +1,554 @@
+"""
+SQLite-backed catalog and loan store for the library app.
+
+Titles live in an indexed ``books`` table with copy counts (a second donation
+of the same title bumps ``copies`` instead of adding a row), and loans in a
+``loans`` table indexed by borrower and by title, so borrow / return / a
+borrower's track are B-tree lookups however large the catalog gets.  Titles
+and borrower names are matched case- and whitespace-insensitively through a
+normalised ``*_key`` column; the title as first entered is kept for display.
+
+Title search (:meth:`LibraryStore.search`) combines a B-tree prefix range
+on ``title_key``, an FTS5 trigram index for substrings (new titles are added to
+it in the same transaction that adds them to ``books``) and, for typos, candidates containing
+the longest correctly spelled start of every query word, ranked by how many
+of the query's trigrams they share.
+
+Catalogs are bulk-loaded from CSV or JSONL with :meth:`LibraryStore.import_catalog`,
+which streams the file in chunks and writes each chunk in one transaction;
+:meth:`~LibraryStore.export_catalog` and :meth:`~LibraryStore.export_loans`
+stream the catalog and the loan history (closed loans are kept in
+``loan_history``) back out a chunk of rows at a time.
+
+    python library_store.py import catalog.csv
+    python library_store.py export catalog.jsonl
+    python library_store.py export loans.csv --loans
+
+The database file (``LIBRARY_DB``, default ``library.db``) survives Streamlit
+reruns and restarts.  Each thread gets its own connection (Streamlit serves
+sessions on different threads); WAL mode lets readers run while one
+borrow/return commits.  Every write runs in a ``BEGIN IMMEDIATE``
+transaction, so concurrent sessions queue on the write lock instead of
+acting on a read another session has since invalidated.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_DB = "library.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    title_key TEXT PRIMARY KEY,
+    title     TEXT NOT NULL,
+    copies    INTEGER NOT NULL DEFAULT 0,
+    available INTEGER NOT NULL DEFAULT 0 CHECK (available >= 0)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS loans (
+    id           INTEGER PRIMARY KEY,
+    borrower_key TEXT NOT NULL,
+    borrower     TEXT NOT NULL,
+    title_key    TEXT NOT NULL REFERENCES books(title_key),
+    borrowed_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loans_by_borrower ON loans (borrower_key, title_key);
+CREATE INDEX IF NOT EXISTS loans_by_title ON loans (title_key);
+CREATE TABLE IF NOT EXISTS loan_history (
+    id           INTEGER PRIMARY KEY,
+    borrower     TEXT NOT NULL,
+    title_key    TEXT NOT NULL,
+    borrowed_at  REAL NOT NULL,
+    returned_at  REAL NOT NULL
+);
+-- Listing what is on the shelf skips titles that are all lent out
+CREATE INDEX IF NOT EXISTS books_on_shelf ON books (title_key) WHERE available > 0;
+
+-- Counters kept by triggers, so totals never need a full COUNT(*) scan
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO stats VALUES
+    ('on_shelf', (SELECT COUNT(*) FROM books WHERE available > 0)),
+    ('loans', (SELECT COUNT(*) FROM loans));
+CREATE TRIGGER IF NOT EXISTS books_insert AFTER INSERT ON books BEGIN
+    UPDATE stats SET value = value + (NEW.available > 0) WHERE name = 'on_shelf';
+END;
+CREATE TRIGGER IF NOT EXISTS books_update AFTER UPDATE OF available ON books BEGIN
+    UPDATE stats SET value = value + (NEW.available > 0) - (OLD.available > 0)
+    WHERE name = 'on_shelf';
+END;
+CREATE TRIGGER IF NOT EXISTS books_delete AFTER DELETE ON books BEGIN
+    UPDATE stats SET value = value - (OLD.available > 0) WHERE name = 'on_shelf';
+END;
+CREATE TRIGGER IF NOT EXISTS loans_insert AFTER INSERT ON loans BEGIN
+    UPDATE stats SET value = value + 1 WHERE name = 'loans';
+END;
+CREATE TRIGGER IF NOT EXISTS loans_delete AFTER DELETE ON loans BEGIN
+    UPDATE stats SET value = value - 1 WHERE name = 'loans';
+END;
+"""
+
+# Needs SQLite >= 3.34 (trigram tokenizer); without it search falls back to LIKE
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5(title_key, tokenize='trigram');
+-- Superseded by indexing in _add_copies: a per-row trigger made FTS5 flush
+-- a segment for every inserted title, ~3x the cost of a bulk import
+DROP TRIGGER IF EXISTS titles_index;
+"""
+FUZZY_CANDIDATES = 200
+MIN_SIMILARITY = 0.4
+IMPORT_CHUNK = 5000
+EXPORT_CHUNK = 5000
+FORMATS = ("csv", "jsonl")
+
+
+def normalize(text):
+    """Lookup key for a title or borrower name."""
+    return " ".join(text.split()).casefold()
+
+
+def _phrase(text):
+    """An FTS5 string literal (substring match under the trigram tokenizer)."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(query, title):
+    """Share of the query's trigrams found in ``title`` (both normalised keys)."""
+    gq = trigrams(query)
+    if not gq:
+        return 1.0 if query in title else 0.0
+    return len(gq & trigrams(title)) / len(gq)
+
+
+class LibraryStore:
+    """Books and loans in one SQLite file."""
+
+    def __init__(self, path=None, seed=()):
+        self.path = path or os.environ.get("LIBRARY_DB", DEFAULT_DB)
+        self._local = threading.local()
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+        self.fts = self._create_search_index(conn)
+        with self.transaction() as conn:
+            if seed and self.is_empty():
+                for title in seed:
+                    self._add_copy(conn, title)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; writes open their own transaction (see transaction())
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """A write transaction holding the database write lock from its start.
+
+        Reads inside it see the latest committed state and nothing can change
+        it before the commit, so check-then-write is safe across sessions.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _create_search_index(conn):
+        try:
+            conn.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        # Catalogs created before the index existed are indexed once
+        if (conn.execute("SELECT 1 FROM titles_fts LIMIT 1").fetchone() is None
+                and conn.execute("SELECT 1 FROM books LIMIT 1").fetchone() is not None):
+            conn.execute("INSERT INTO titles_fts (title_key) SELECT title_key FROM books")
+        return True
+
+    # ---------------------------
+    # Catalog
+    # ---------------------------
+    def _add_copies(self, conn, rows):
+        """Upsert ``(title_key, title, copies, copies)`` rows; index the new titles."""
+        rows = sorted(rows)
+        if self.fts:
+            keys = sorted({row[0] for row in rows})
+            known = {key for key, in conn.execute(
+                "SELECT title_key FROM books WHERE title_key IN (SELECT value FROM json_each(?))",
+                (json.dumps(keys),),
+            )}
+        conn.executemany(
+            "INSERT INTO books (title_key, title, copies, available) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (title_key) DO UPDATE SET copies = copies + excluded.copies, "
+            "available = available + excluded.available",
+            rows,
+        )
+        if self.fts:
+            conn.executemany("INSERT INTO titles_fts (title_key) VALUES (?)",
+                             [(key,) for key in keys if key not in known])
+
+    def _add_copy(self, conn, title, copies=1):
+        self._add_copies(conn, [(normalize(title), title.strip(), copies, copies)])
+
+    def donate(self, title, copies=1):
+        with self.transaction() as conn:
+            self._add_copy(conn, title, copies)
+
+    def book(self, title):
+        """``(title, copies, available)`` or ``None``."""
+        return self.connection().execute(
+            "SELECT title, copies, available FROM books WHERE title_key = ?", (normalize(title),)
+        ).fetchone()
+
+    def _stat(self, name):
+        return self.connection().execute("SELECT value FROM stats WHERE name = ?", (name,)).fetchone()[0]
+
+    def is_empty(self):
+        return self.connection().execute("SELECT 1 FROM books LIMIT 1").fetchone() is None
+
+    def available_count(self):
+        """Titles with at least one copy on the shelf."""
+        return self._stat("on_shelf")
+
+    def available_page(self, limit=50, after=None):
+        """One page of ``(title, copies, available)`` rows on the shelf, in title order.
+
+        Keyset pagination: pass the returned cursor as ``after`` for the next
+        page, so a page costs the same at the end of the catalog as at the
+        start.  The cursor is ``None`` after the last page.
+        """
+        rows = self.connection().execute(
+            "SELECT title_key, title, copies, available FROM books "
+            "WHERE available > 0 AND title_key > ? ORDER BY title_key LIMIT ?",
+            (after or "", limit + 1),
+        ).fetchall()
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [row[1:] for row in rows[:limit]], cursor
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def search(self, query, limit=20):
+        """``(title, copies, available)`` of titles matching ``query``, best first.
+
+        Prefix matches come first, then titles containing the query, then
+        (for misspellings) titles with the most similar trigrams.
+        """
+        key = normalize(query)
+        if not key:
+            return []
+        conn = self.connection()
+        found = OrderedDict()
+
+        def take(rows):
+            for title_key, *row in rows:
+                if len(found) >= limit:
+                    break
+                found.setdefault(title_key, tuple(row))
+
+        # Prefix: a range scan on the primary key
+        take(conn.execute(
+            "SELECT title_key, title, copies, available FROM books "
+            "WHERE title_key >= ? AND title_key < ? ORDER BY title_key LIMIT ?",
+            (key, key + "\U0010ffff", limit),
+        ))
+        if len(found) < limit:
+            take(self._substring(conn, key, limit))
+        if len(found) < limit and len(key) >= 3:
+            take(self._fuzzy(conn, key, limit - len(found), exclude=found))
+        return list(found.values())
+
+    def _substring(self, conn, key, limit):
+        if self.fts:
+            if len(key) < 3:
+                # Shorter than a trigram: the prefix range is all we can do fast
+                return []
+            return conn.execute(
+                "SELECT b.title_key, b.title, b.copies, b.available FROM titles_fts f "
+                "JOIN books b ON b.title_key = f.title_key WHERE titles_fts MATCH ? LIMIT ?",
+                (_phrase(key), limit),
+            ).fetchall()
+        pattern = "%" + key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return conn.execute(
+            "SELECT title_key, title, copies, available FROM books "
+            "WHERE title_key LIKE ? ESCAPE '\\' LIMIT ?", (pattern, limit),
+        ).fetchall()
+
+    def _fuzzy(self, conn, key, limit, exclude=()):
+        if not self.fts:
+            return []
+        # Typos mostly sit past the first letters of a word: keep the longest
+        # start of each word that still occurs in some title
+        parts = []
+        for word in key.split():
+            for n in range(len(word), 2, -1):
+                if conn.execute("SELECT 1 FROM titles_fts WHERE titles_fts MATCH ? LIMIT 1",
+                                (_phrase(word[:n]),)).fetchone():
+                    parts.append(_phrase(word[:n]))
+                    break
+        candidates = []
+        for joiner in (" AND ", " OR "):
+            if parts and not candidates:
+                candidates = conn.execute(
+                    "SELECT b.title_key, b.title, b.copies, b.available FROM titles_fts f "
+                    "JOIN books b ON b.title_key = f.title_key WHERE titles_fts MATCH ? LIMIT ?",
+                    (joiner.join(parts), FUZZY_CANDIDATES),
+                ).fetchall()
+        # Best coverage of the query first, shorter (closer) titles on ties
+        scored = sorted(((similarity(key, row[0]), row) for row in candidates
+                         if row[0] not in exclude), key=lambda sr: (-sr[0], len(sr[1][0])))
+        return [row for score, row in scored[:limit] if score >= MIN_SIMILARITY]
+
+    # ---------------------------
+    # Loans
+    # ---------------------------
+    def borrow(self, borrower, title):
+        """Take out one copy; returns ``False`` if none is available."""
+        key = normalize(title)
+        with self.transaction() as conn:
+            # The decrement only matches while a copy is left, so two sessions
+            # can never both take the last one
+            taken = conn.execute(
+                "UPDATE books SET available = available - 1 WHERE title_key = ? AND available > 0",
+                (key,),
+            ).rowcount
+            if not taken:
+                return False
+            conn.execute(
+                "INSERT INTO loans (borrower_key, borrower, title_key, borrowed_at) VALUES (?, ?, ?, ?)",
+                (normalize(borrower), borrower.strip(), key, time.time()),
+            )
+        return True
+
+    def return_book(self, borrower, title):
+        """Close one loan of ``title`` by ``borrower``; ``False`` if there is none."""
+        key = normalize(title)
+        with self.transaction() as conn:
+            # Under the write lock: no other session can close this loan first
+            loan = conn.execute(
+                "SELECT id, borrower, borrowed_at FROM loans "
+                "WHERE borrower_key = ? AND title_key = ? ORDER BY id LIMIT 1",
+                (normalize(borrower), key),
+            ).fetchone()
+            if loan is None:
+                return False
+            conn.execute("DELETE FROM loans WHERE id = ?", (loan[0],))
+            conn.execute(
+                "INSERT INTO loan_history (borrower, title_key, borrowed_at, returned_at) "
+                "VALUES (?, ?, ?, ?)", (loan[1], key, loan[2], time.time()),
+            )
+            conn.execute("UPDATE books SET available = available + 1 WHERE title_key = ?", (key,))
+        return True
+
+    def loans(self, borrower=None, limit=100, offset=0):
+        """``(borrower, title, borrowed_at)`` rows, for one borrower or everyone."""
+        query = ("SELECT l.borrower, b.title, l.borrowed_at FROM loans l "
+                 "JOIN books b ON b.title_key = l.title_key")
+        params = ()
+        if borrower:
+            query += " WHERE l.borrower_key = ?"
+            params = (normalize(borrower),)
+        query += " ORDER BY l.id LIMIT ? OFFSET ?"
+        return self.connection().execute(query, params + (limit, offset)).fetchall()
+
+    def loan_count(self):
+        return self._stat("loans")
+
+    # ---------------------------
+    # Bulk import / export
+    # ---------------------------
+    def import_catalog(self, source, fmt=None, chunk_size=IMPORT_CHUNK, progress=None):
+        """Add every title in a CSV or JSONL catalog; returns ``(added, skipped)``.
+
+        ``source`` is a path or a text/binary file object.  CSV needs a
+        ``title`` column and may have ``copies`` (default 1); JSONL lines are
+        objects with the same keys.  Rows are read lazily and written
+        ``chunk_size`` at a time, one transaction per chunk, so memory stays
+        flat and other sessions get the write lock between chunks.
+        ``progress(rows, bytes_read)`` is called after every chunk.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            fmt = fmt or _format_of(source)
+            with open(source, "rb") as f:
+                return self.import_catalog(f, fmt, chunk_size, progress)
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown catalog format {fmt!r}; expected one of {FORMATS}")
+        if isinstance(source, io.TextIOBase):
+            return self._import_records(source, source, fmt, chunk_size, progress)
+        text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+        try:
+            return self._import_records(text, source, fmt, chunk_size, progress)
+        finally:
+            # Hand the caller's file back open
+            text.detach()
+
+    def _import_records(self, text, raw, fmt, chunk_size, progress):
+        records = csv.DictReader(text) if fmt == "csv" else _jsonl_records(text)
+        if fmt == "csv" and "title" not in (records.fieldnames or ()):
+            raise ValueError("CSV catalog needs a 'title' column")
+
+        added = skipped = 0
+        chunk = []
+
+        def flush():
+            if chunk:
+                with self.transaction() as conn:
+                    self._add_copies(conn, chunk)
+                chunk.clear()
+            if progress is not None:
+                progress(added + skipped, _tell(raw))
+
+        for record in records:
+            row = _catalog_row(record)
+            if row is None:
+                skipped += 1
+                continue
+            chunk.append(row)
+            added += 1
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+        return added, skipped
+
+    def _iter_rows(self, query, start, chunk_size):
+        """Rows of a keyset ``query`` (``key > ? ... LIMIT ?``, key first), a chunk at a time."""
+        conn = self.connection()
+        after = start
+        while True:
+            rows = conn.execute(query, (after, chunk_size)).fetchall()
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = rows[-1][0]
+
+    def export_catalog(self, fmt="csv", chunk_size=EXPORT_CHUNK):
+        """The catalog as CSV or JSONL text, yielded a line at a time."""
+        rows = self._iter_rows(
+            "SELECT title_key, title, copies, available FROM books "
+            "WHERE title_key > ? ORDER BY title_key LIMIT ?", "", chunk_size)
+        return _lines(((title, copies, available) for _, title, copies, available in rows),
+                      ("title", "copies", "available"), fmt)
+
+    def export_loans(self, fmt="csv", chunk_size=EXPORT_CHUNK):
+        """Every loan, closed (``loan_history``) then open, yielded a line at a time."""
+        closed = self._iter_rows(
+            "SELECT h.id, h.borrower, b.title, h.borrowed_at, h.returned_at FROM loan_history h "
+            "JOIN books b ON b.title_key = h.title_key WHERE h.id > ? ORDER BY h.id LIMIT ?",
+            0, chunk_size)
+        open_ = self._iter_rows(
+            "SELECT l.id, l.borrower, b.title, l.borrowed_at, NULL FROM loans l "
+            "JOIN books b ON b.title_key = l.title_key WHERE l.id > ? ORDER BY l.id LIMIT ?",
+            0, chunk_size)
+        rows = (row[1:] for part in (closed, open_) for row in part)
+        return _lines(rows, ("borrower", "title", "borrowed_at", "returned_at"), fmt)
+
+
+def _format_of(path):
+    ext = os.path.splitext(str(path))[1].lower().lstrip(".")
+    return "jsonl" if ext in ("jsonl", "ndjson", "json") else "csv"
+
+
+def _tell(f):
+    try:
+        return f.tell()
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _jsonl_records(lines):
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Counted as skipped by the caller
+                yield None
+
+
+def _catalog_row(record):
+    """``(title_key, title, copies, copies)`` for an import record, or ``None``."""
+    if not isinstance(record, dict):
+        return None
+    title = str(record.get("title") or "").strip()
+    try:
+        copies = int(record.get("copies") or 1)
+    except (TypeError, ValueError):
+        return None
+    if not title or copies < 1:
+        return None
+    return normalize(title), title, copies, copies
+
+
+def _lines(rows, header, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {FORMATS}")
+    if fmt == "jsonl":
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n"
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.getvalue():
+        yield buf.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export of the library catalog")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("file", help="CSV or JSONL file ('-' for stdout on export)")
+    parser.add_argument("--db", help="database file (default: LIBRARY_DB or library.db)")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--loans", action="store_true", help="export loan history, not the catalog")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK)
+    args = parser.parse_args(argv)
+
+    store = LibraryStore(args.db)
+    fmt = args.format or _format_of(args.file)
+    if args.action == "import":
+        size = os.path.getsize(args.file)
+
+        def report(rows, done):
+            print(f"\r{rows} rows · {100 * (done or 0) / max(size, 1):.0f}%",
+                  end="", file=sys.stderr, flush=True)
+
+        t0 = time.perf_counter()
+        added, skipped = store.import_catalog(args.file, fmt, args.chunk_size, report)
+        print(f"\nimported {added} rows ({skipped} skipped) in "
+              f"{time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        return 0
+    lines = (store.export_loans if args.loans else store.export_catalog)(fmt, args.chunk_size)
+    out = sys.stdout if args.file == "-" else open(args.file, "w", encoding="utf-8", newline="")
+    try:
+        out.writelines(lines)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
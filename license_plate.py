@@ -1,9 +1,17 @@
-import streamlit as st
-from ultralytics import YOLO
-import numpy as np
-import cv2
-from PIL import Image
 import os
+import tempfile
+import time
+
+import streamlit as st
+
+from box_renderer import BoxRenderer, fixed_color
+from detector_registry import DETECTORS, resolve_weights
+from image_io import decode_upload, upload_buffer
+from instrumentation import show_trace, start_request
+from previews import download_full, encode_preview, show_preview
+from result_cache import cached_detect, digest_bytes
+from video_stream import process_video
+from warmup import mark, show_readiness, start_warmup, wait_ready
 
 # ---------------------------
 # Page Config
@@ -15,65 +23,144 @@ st.set_page_config(
 )
 
 st.title("🚗 License Plate Detection")
-st.write("Upload an image to detect **Vehicle License Plate**")
+st.write("Upload an image or gate camera video to detect **Vehicle License Plate**")
 
 # ---------------------------
-# Load Model (Local + Cloud Safe)
+# Load Model (shared registry, loaded + warmed up in the background)
 # ---------------------------
-MODEL_PATH = "license_best.pt"
+try:
+    resolve_weights(DETECTORS["license"])
+except FileNotFoundError:
+    st.error("❌ license_best.pt file not find in  project folder ")
+    st.stop()
+
+start_warmup(["license"])
+show_readiness(["license"])
+
 
-@st.cache_resource
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        st.error("❌ license_best.pt file not find in  project folder ")
-        st.stop()
-    return YOLO(MODEL_PATH)
+def plate_renderer(model):
+    # Green box with the label (usually: license_plate) drawn above it
+    return BoxRenderer(
+        names=model.names,
+        colors=fixed_color((0, 255, 0)),
+        label_background=False,
+    )
 
-model = load_model()
+
+mode = st.radio("Input", ["Image", "Video"], horizontal=True)
 
 # ---------------------------
-# Upload Image
+# Video (gate camera footage)
 # ---------------------------
-uploaded_file = st.file_uploader(
-    "📤 Upload Vehicle Image",
-    type=["jpg", "jpeg", "png"]
-)
+if mode == "Video":
+    video_file = st.file_uploader(
+        "📤 Upload Gate Camera Video",
+        type=["mp4", "avi", "mov", "mkv"]
+    )
+    realtime = st.checkbox("Keep up with real time (drop frames when behind)", value=True)
+
+    if video_file is not None and st.button("🔍 Detect License Plates"):
+        trace = start_request("license-video")
+        with st.spinner("Loading model..."), trace.stage("model_wait"):
+            model = wait_ready("license")
+        renderer = plate_renderer(model)
+        # OpenCV needs a real file to decode from
+        suffix = os.path.splitext(video_file.name)[1]
+        with trace.stage("upload"), tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(video_file.getvalue())
+            video_path = tmp.name
+
+        preview = st.empty()
+        last_preview = [0.0]
+
+        def on_frame_preview(index, frame, tracker):
+            # Refresh the preview twice a second, drawing tracked boxes
+            now = time.perf_counter()
+            if now - last_preview[0] < 0.5:
+                return
+            last_preview[0] = now
+            with trace.stage("preview"):
+                annotated = renderer.render(frame, tracker.current())
+                # Every frame differs, so the encode is not worth caching
+                preview.image(encode_preview(annotated), caption=f"Frame {index}",
+                              use_container_width=True)
 
-if uploaded_file is not None:
-    try:
-        image = Image.open(uploaded_file).convert("RGB")
-        st.image(image, caption="Uploaded Image", use_container_width=True)
+        try:
+            # Model time (summed over frames) is recorded under this stage
+            with st.spinner("Detecting License Plates..."), trace.stage("video"):
+                report = process_video(video_path, model, conf=0.4,
+                                       realtime=realtime, on_frame=on_frame_preview)
+        except Exception as e:
+            st.error("❌ Video process  error ")
+            st.code(str(e))
+        else:
+            st.success(f"✅ Detection Complete: {len(report.records)} plates")
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("Achieved FPS", f"{report.achieved_fps:.1f}", f"source {report.source_fps:.0f}")
+            m2.metric("Frames processed", report.frames_processed)
+            m3.metric("Dropped frames", report.dropped_frames)
+            m4.metric("Detector calls", report.detector_calls)
 
-        if st.button("🔍 Detect License Plate"):
-            with st.spinner("Detecting License Plate..."):
-                img = np.array(image)
+            # One record per plate track, with its sharpest crop
+            for record in report.records:
+                c1, c2 = st.columns([1, 2])
+                if record["crop"] is not None and record["crop"].size:
+                    c1.image(record["crop"], channels="BGR", use_container_width=True)
+                c2.write(
+                    f"**Plate #{record['track_id']}** · seen {record['first_seen_s']}s–"
+                    f"{record['last_seen_s']}s · best conf {record['best_conf']:.2f} "
+                    f"· {record['detections']} detections"
+                )
+            mark("first_detection")
+            show_trace(trace.finish())
+        finally:
+            os.remove(video_path)
 
-                results = model(img, conf=0.4)
+else:
+    # ---------------------------
+    # Upload Image
+    # ---------------------------
+    uploaded_file = st.file_uploader(
+        "📤 Upload Vehicle Image",
+        type=["jpg", "jpeg", "png"]
+    )
 
-                for box in results[0].boxes:
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    label = model.names[cls_id]  # usually: license_plate
+    if uploaded_file is not None:
+        try:
+            # Timed from decode; recorded only when a detection actually runs
+            trace = start_request("license")
+            with trace.stage("decode"):
+                img = decode_upload(uploaded_file)
+            if img is None:
+                raise ValueError("Unsupported or corrupted image file")
+            with trace.stage("hash"):
+                image_digest = digest_bytes(upload_buffer(uploaded_file))
+            # A display-sized JPEG, encoded once per upload
+            with trace.stage("display"):
+                show_preview(st, img, image_digest, caption="Uploaded Image")
 
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
+            if st.button("🔍 Detect License Plate"):
+                with st.spinner("Detecting License Plate..."):
+                    with trace.stage("model_wait"):
+                        model = wait_ready("license")
+                    renderer = plate_renderer(model)
+                    with trace.stage("detect"):
+                        dets = cached_detect(model, img, image_digest)
+                    dets = dets.filter(0.4)
 
-                    color = (0, 255, 0)
-                    text = f"{label} {conf:.2f}"
+                    with trace.stage("draw"):
+                        renderer.render(img, dets, out=img)
 
-                    cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(
-                        img,
-                        text,
-                        (x1, max(y1 - 10, 20)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6,
-                        color,
-                        2
-                    )
+                st.success("✅ Detection Complete")
+                with trace.stage("display"):
+                    show_preview(st, img, image_digest, f"{model.identity}|0.4",
+                                 caption="License Plate Detection Result")
+                download_full(st, img, f"plates_{uploaded_file.name}")
+                mark("first_detection")
+                show_trace(trace.finish())
 
-            st.success("✅ Detection Complete")
-            st.image(img, caption="License Plate Detection Result", use_container_width=True)
+        except Exception as e:
+            st.error("❌ Image process  error ")
+            st.code(str(e))
 
-    except Exception as e:
-        st.error("❌ Image process  error ")
-        st.code(str(e))
+mark("interactive")
@@ -1,9 +1,12 @@
 import streamlit as st
-from ultralytics import YOLO
-import numpy as np
-import cv2
-from PIL import Image
-import os
+
+from box_renderer import BoxRenderer, palette_color
+from detector_registry import DETECTORS, resolve_weights
+from image_io import decode_upload, upload_buffer
+from instrumentation import show_trace, start_request
+from previews import download_full, show_preview
+from result_cache import cached_detect, digest_bytes
+from warmup import mark, show_readiness, start_warmup, wait_ready
 
 # ---------------------------
 # Page Config
@@ -18,18 +21,19 @@ st.title("😷 Mask / No Mask Detection")
 st.write("Upload an image and the model will detect **Mask** or **No Mask**")
 
 # ---------------------------
-# Load Model (Safe way)
+# Load Model (shared registry, loaded + warmed up in the background)
 # ---------------------------
-MODEL_PATH = "best.pt"
+try:
+    resolve_weights(DETECTORS["mask"])
+except FileNotFoundError:
+    st.error("❌ best.pt file nahi mili! Please same folder me rakho.")
+    st.stop()
 
-@st.cache_resource
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        st.error("❌ best.pt file nahi mili! Please same folder me rakho.")
-        st.stop()
-    return YOLO(MODEL_PATH)
+start_warmup(["mask"])
+show_readiness(["mask"])
 
-model = load_model()
+# Same per-class palette as ultralytics' results.plot()
+mask_colors = palette_color((255, 255, 255))
 
 # ---------------------------
 # Image Upload
@@ -41,21 +45,37 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     try:
-        image = Image.open(uploaded_file).convert("RGB")
-        st.image(image, caption="Uploaded Image", use_container_width=True)
+        # Timed from decode; recorded only when a detection actually runs
+        trace = start_request("mask")
+        with trace.stage("decode"):
+            img = decode_upload(uploaded_file)
+        if img is None:
+            raise ValueError("Unsupported or corrupted image file")
+        with trace.stage("hash"):
+            image_digest = digest_bytes(upload_buffer(uploaded_file))
+        # A display-sized JPEG, encoded once per upload
+        with trace.stage("display"):
+            show_preview(st, img, image_digest, caption="Uploaded Image")
 
         if st.button("🔍 Detect Mask"):
             with st.spinner("Detecting..."):
-                img_np = np.array(image)
-                results = model(img_np, conf=0.4)
-
-                annotated_img = results[0].plot()
-                annotated_img = cv2.cvtColor(annotated_img, cv2.COLOR_BGR2RGB)
+                with trace.stage("model_wait"):
+                    model = wait_ready("mask")
+                renderer = BoxRenderer(names=model.names, colors=mask_colors)
+                with trace.stage("detect"):
+                    dets = cached_detect(model, img, image_digest)
+                with trace.stage("draw"):
+                    renderer.render(img, dets.filter(0.4), out=img)
 
             st.success("✅ Detection Complete")
-            st.image(annotated_img, caption="Detection Result", use_container_width=True)
+            with trace.stage("display"):
+                show_preview(st, img, image_digest, f"{model.identity}|0.4", caption="Detection Result")
+            download_full(st, img, f"mask_{uploaded_file.name}")
+            mark("first_detection")
+            show_trace(trace.finish())
 
     except Exception as e:
         st.error("❌ Image process karte waqt error aaya")
         st.code(str(e))
 
+mark("interactive")
@@ -0,0 +1,141 @@
+"""
+Display-sized, pre-encoded images for the apps' result views.
+
+Given a NumPy array, ``st.image`` converts BGR to RGB (a full-frame copy),
+encodes the full-resolution frame with PIL, decodes it again to shrink it to
+the page width and encodes once more — for a 12 MP upload, twice per
+request (original and annotated) and again on every rerun.  What reaches the
+browser is at most ~1460 px wide anyway.
+
+:func:`show_preview` instead shrinks the frame to ``PREVIEW_MAX_SIDE``
+(default 1280) with ``INTER_AREA``, encodes it once as JPEG with
+``cv2.imencode`` and hands the bytes to ``st.image``, which serves JPEG
+bytes of that size unchanged.  The encoded bytes are cached in a small
+LRU (``PREVIEW_CACHE_MB``, default 32) keyed on the content hash of the
+upload plus what was drawn on it, so reruns and repeated uploads skip even
+the resize.  The full-resolution annotated frame is only encoded when the
+user asks for it, through :func:`download_full` (``st.download_button``
+with deferred data).
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from batching import make_thumbnail
+
+PREVIEW_MAX_SIDE = 1280
+PREVIEW_QUALITY = 85
+FULL_QUALITY = 95
+DEFAULT_CACHE_MB = 32
+
+
+def encode_jpeg(img, quality=PREVIEW_QUALITY):
+    """JPEG bytes of a BGR array."""
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("could not encode image")
+    return buf.tobytes()
+
+
+def pixel_digest(img):
+    """Content hash of an array, for images with no upload digest."""
+    h = hashlib.sha1(str(img.shape).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+class PreviewCache:
+    """LRU of encoded previews by key, bounded in bytes."""
+
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("PREVIEW_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_preview_cache():
+    """The cache shared by every app running in this process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PreviewCache()
+        return _cache
+
+
+def encode_preview(img, max_side=None, quality=PREVIEW_QUALITY):
+    """JPEG bytes of ``img`` shrunk to ``max_side`` (default ``PREVIEW_MAX_SIDE``), uncached."""
+    if max_side is None:
+        max_side = int(os.environ.get("PREVIEW_MAX_SIDE", PREVIEW_MAX_SIDE))
+    return encode_jpeg(make_thumbnail(img, max_side), quality)
+
+
+def preview_bytes(img, digest=None, variant="", max_side=None, quality=PREVIEW_QUALITY):
+    """JPEG bytes of ``img`` shrunk to ``max_side``, encoded at most once.
+
+    ``digest`` is :func:`~result_cache.digest_bytes` of the upload ``img``
+    was decoded from and ``variant`` names what was drawn on it (detector,
+    threshold...); without a digest the pixels are hashed.
+    """
+    if max_side is None:
+        max_side = int(os.environ.get("PREVIEW_MAX_SIDE", PREVIEW_MAX_SIDE))
+    key = f"{digest or pixel_digest(img)}|{variant}|{max_side}|{quality}"
+    cache = get_preview_cache()
+    data = cache.get(key)
+    if data is None:
+        data = encode_preview(img, max_side, quality)
+        cache.put(key, data)
+    return data
+
+
+def show_preview(target, img, digest=None, variant="", caption=None):
+    """``target.image`` of the cached preview of ``img`` (``target``: ``st`` or a column)."""
+    target.image(preview_bytes(img, digest, variant), caption=caption, use_container_width=True)
+
+
+def download_full(target, img, file_name, label="⬇️ Download full resolution", key=None):
+    """A download button that encodes ``img`` at full resolution only when clicked."""
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return target.download_button(
+        label, lambda: encode_jpeg(img, FULL_QUALITY), file_name=f"{stem}.jpg",
+        mime="image/jpeg", key=key, on_click="ignore",
+    )
@@ -1,4 +1,5 @@
-from ultralytics import YOLO
-model = YOLO("fruit_best.pt")
-for k, v in model.names.items():
+from checkpoint_meta import read_metadata
+
+meta = read_metadata("fruit_best.pt")
+for k, v in meta["names"].items():
     print(f"{k}: {v}")
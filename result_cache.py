@@ -0,0 +1,167 @@
+"""
+Content-addressed cache of raw detections.
+
+Streamlit re-runs the whole script on every widget change, so the same image
+would otherwise go through the model again when a slider moves or the detect
+button is pressed twice.  Results are keyed on the SHA-1 of the uploaded bytes
++ the detector identity + imgsz and stored *unthresholded* (down to
+``RAW_CONF``), so a confidence change is only a re-filter and re-draw.
+Images above the tiling threshold are detected with
+:mod:`tiled_inference` and cached under their own key.
+
+The in-memory part is an LRU bounded by ``RESULT_CACHE_MB`` (default 64).
+Setting ``RESULT_CACHE_DIR`` also persists every entry as a small ``.npy``
+file, so results survive app restarts.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from detections import Detections
+from tiled_inference import DEFAULT_TILE, detect_auto, should_tile
+
+# Lowest confidence kept in the cache; every app threshold is above this
+RAW_CONF = 0.01
+DEFAULT_CACHE_MB = 64
+
+
+def digest_bytes(data):
+    """Content hash of an uploaded file."""
+    return hashlib.sha1(data).hexdigest()
+
+
+class ResultCache:
+    """LRU of :class:`Detections` by key, bounded in bytes, optionally on disk."""
+
+    def __init__(self, max_bytes=None, disk_dir=None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("RESULT_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+        if disk_dir is None:
+            disk_dir = os.environ.get("RESULT_CACHE_DIR") or None
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_digest, model_identity, imgsz=None):
+        return hashlib.sha1(f"{image_digest}|{model_identity}|{imgsz}".encode()).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def get(self, key):
+        with self._lock:
+            dets = self._entries.get(key)
+            if dets is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dets
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            dets = Detections.from_array(np.load(self._disk_path(key)))
+            self._remember(key, dets)
+            with self._lock:
+                self.hits += 1
+            return dets
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, dets):
+        self._remember(key, dets)
+        if self.disk_dir:
+            # Write then rename so a crash never leaves a truncated entry
+            tmp = self._disk_path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, dets.to_array())
+            os.replace(tmp, self._disk_path(key))
+
+    def _remember(self, key, dets):
+        size = dets.xyxy.nbytes + dets.conf.nbytes + dets.cls.nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.xyxy.nbytes + old.conf.nbytes + old.cls.nbytes
+            self._entries[key] = dets
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.xyxy.nbytes + evicted.conf.nbytes + evicted.cls.nbytes
+
+    def get_or_compute(self, key, compute):
+        dets = self.get(key)
+        if dets is None:
+            dets = compute()
+            self.put(key, dets)
+        return dets
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """The cache shared by every app running in this process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def cached_detect(detector, image, image_digest, imgsz=None):
+    """Raw (``RAW_CONF``) detections for ``image``, computed at most once.
+
+    ``detector`` is a registry :class:`~detector_registry.Detector`;
+    ``image_digest`` is :func:`digest_bytes` of the bytes ``image`` was
+    decoded from.  Filter the result with ``Detections.filter(conf)``.
+    """
+    # Large images go through sliced inference, which gives different boxes
+    mode = f"tiled{imgsz or DEFAULT_TILE}" if should_tile(image) else imgsz
+    key = ResultCache.make_key(image_digest, detector.identity, mode)
+
+    def compute():
+        return detect_auto(detector, image, conf=RAW_CONF, imgsz=imgsz)
+
+    return get_result_cache().get_or_compute(key, compute)
+
+
+def cached_detect_batch(detector, images, image_digests, imgsz=None):
+    """Like :func:`cached_detect` for a mini-batch; only cache misses hit the model.
+
+    Images large enough for tiling are detected one by one through
+    :func:`cached_detect`; the rest share one batched forward pass.
+    """
+    cache = get_result_cache()
+    out = [None] * len(images)
+    for i, img in enumerate(images):
+        if should_tile(img) and not getattr(detector, "remote", False):
+            out[i] = cached_detect(detector, img, image_digests[i], imgsz)
+    keys = [ResultCache.make_key(d, detector.identity, imgsz) for d in image_digests]
+    for i, key in enumerate(keys):
+        if out[i] is None:
+            out[i] = cache.get(key)
+    missing = [i for i, dets in enumerate(out) if dets is None]
+    if missing:
+        kwargs = {"conf": RAW_CONF}
+        if imgsz is not None:
+            kwargs["imgsz"] = imgsz
+        results = detector([images[i] for i in missing], **kwargs)
+        for i, result in zip(missing, results):
+            out[i] = Detections.from_result(result)
+            cache.put(keys[i], out[i])
+    return out
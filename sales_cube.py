@@ -0,0 +1,283 @@
+"""
+Pre-aggregated Superstore sales cube, updated incrementally.
+
+The EDA's questions (profitability by category and region, discount vs
+profit) are all sums over a handful of dimensions.  :class:`SalesCube` keeps
+those sums — Sales, Profit, Quantity, Discount and the row count — in one
+dense numpy array indexed by Region × Category × Sub-Category × Segment ×
+order month, so a slice or roll-up is a few array reductions over some tens
+of thousands of cells, whatever the number of raw orders.
+
+New order rows are folded in with :meth:`SalesCube.add` (one ``bincount``
+per measure; new labels such as a new month grow the array).  The cube
+remembers the highest ``Row ID`` it has seen, so :func:`update_from_csv` can
+be pointed at each day's full export and only aggregates the rows added
+since the last refresh.  When the export only grew (the bytes read last time
+are unchanged, checked by hash), only the appended bytes are parsed at all.
+Cubes are saved as a compressed ``.npz``.
+
+    python sales_cube.py update Superstore.csv              # build / refresh
+    python sales_cube.py query --by Region Category
+    python sales_cube.py query --by Month --where Region=West --months 2016-01 2016-12
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CUBE = "sales_cube.npz"
+DIMENSIONS = ("Region", "Category", "Sub-Category", "Segment", "Month")
+MEASURES = ("Sales", "Profit", "Quantity", "Discount", "count")
+DATE_COLUMN = "Order Date"
+ROW_ID = "Row ID"
+MISSING = "(missing)"
+
+
+class SalesCube:
+    """Measure sums per cell of ``DIMENSIONS``, in a dense array."""
+
+    def __init__(self):
+        self.labels = {dim: [] for dim in DIMENSIONS}
+        self._index = {dim: {} for dim in DIMENSIONS}
+        self.data = np.zeros((0,) * len(DIMENSIONS) + (len(MEASURES),))
+        # Highest Row ID aggregated so far (None: rows are not tracked)
+        self.high_water = None
+        self.rows = 0
+        # Size and SHA-1 of the export last read by update_from_csv
+        self.source = None
+
+    # ---------------------------
+    # Building
+    # ---------------------------
+    def _codes(self, dim, values, label_of=str):
+        """Cell coordinates of ``values`` along ``dim``, adding new labels."""
+        uniques_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        index = self._index[dim]
+        lookup = np.empty(len(uniques), dtype=np.intp)
+        # Only the distinct values of the chunk go through Python
+        for i, label in enumerate(uniques):
+            label = MISSING if pd.isna(label) else label_of(label)
+            if label not in index:
+                index[label] = len(self.labels[dim])
+                self.labels[dim].append(label)
+            lookup[i] = index[label]
+        return lookup[uniques_codes]
+
+    def _grow(self):
+        shape = tuple(len(self.labels[dim]) for dim in DIMENSIONS) + (len(MEASURES),)
+        if shape != self.data.shape:
+            grown = np.zeros(shape)
+            grown[tuple(slice(0, n) for n in self.data.shape)] = self.data
+            self.data = grown
+
+    def add(self, orders, after=None):
+        """Aggregate new order rows (a DataFrame) into the cube; returns rows added.
+
+        Rows with a ``Row ID`` at or below ``after`` (default: the
+        :attr:`high_water` mark) were aggregated before and are skipped.
+        Missing measures count as 0.
+        """
+        if ROW_ID in orders.columns:
+            after = self.high_water if after is None else after
+            ids = pd.to_numeric(orders[ROW_ID], errors="coerce")
+            if after is not None:
+                orders, ids = orders[ids > after], ids[ids > after]
+            if ids.notna().any():
+                self.high_water = max(self.high_water or 0, int(ids.max()))
+        if orders.empty:
+            return 0
+
+        dates = pd.to_datetime(orders[DATE_COLUMN], errors="coerce")
+        months = dates.dt.year * 100 + dates.dt.month
+        codes = [
+            self._codes(dim, months, lambda ym: f"{int(ym) // 100:04d}-{int(ym) % 100:02d}")
+            if dim == "Month" else self._codes(dim, orders[dim])
+            for dim in DIMENSIONS
+        ]
+        self._grow()
+        flat = np.ravel_multi_index(codes, self.data.shape[:-1])
+        cells = self.data.reshape(-1, len(MEASURES))
+        for m, measure in enumerate(MEASURES):
+            weights = None
+            if measure != "count":
+                weights = np.nan_to_num(orders[measure].to_numpy(dtype="float64", na_value=0.0))
+            cells[:, m] += np.bincount(flat, weights=weights, minlength=len(cells))
+        self.rows += len(orders)
+        return len(orders)
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def _selection(self, where, months):
+        """Per-dimension label indices to keep (``None``: all)."""
+        keep = {}
+        for dim, wanted in (where or {}).items():
+            if dim not in self._index:
+                raise KeyError(f"unknown dimension {dim!r}; expected one of {DIMENSIONS}")
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            keep[dim] = [self._index[dim][w] for w in wanted if w in self._index[dim]]
+        if months is not None:
+            first, last = months
+            in_range = [i for i, m in enumerate(self.labels["Month"])
+                        if (first is None or m >= first) and (last is None or m <= last)]
+            keep["Month"] = [i for i in keep.get("Month", in_range) if i in set(in_range)]
+        return keep
+
+    def rollup(self, by=(), where=None, months=None):
+        """Measure sums grouped by the dimensions ``by`` over the selected cells.
+
+        ``where`` maps a dimension to a label or list of labels; ``months`` is
+        an inclusive ``("YYYY-MM", "YYYY-MM")`` range (either end may be
+        ``None``).  Returns a DataFrame with the sums plus ``margin`` (profit
+        / sales) and ``avg_discount``, indexed by ``by`` in label order.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        for dim in by:
+            if dim not in DIMENSIONS:
+                raise KeyError(f"unknown dimension {dim!r}; expected one of {DIMENSIONS}")
+        cube = self.data
+        labels = dict(self.labels)
+        for dim, keep in self._selection(where, months).items():
+            axis = DIMENSIONS.index(dim)
+            cube = np.take(cube, keep, axis=axis)
+            labels[dim] = [self.labels[dim][i] for i in keep]
+        # Sum every dimension not grouped on in one reduction
+        summed = tuple(i for i, dim in enumerate(DIMENSIONS) if dim not in by)
+        cube = cube.sum(axis=summed)
+        kept = [dim for dim in DIMENSIONS if dim in by]
+        cube = np.moveaxis(cube, [kept.index(dim) for dim in by], range(len(by)))
+
+        cells = cube.reshape(-1, len(MEASURES))
+        if by:
+            index = pd.MultiIndex.from_product([labels[dim] for dim in by], names=by)
+            occupied = cells[:, MEASURES.index("count")] > 0
+            frame = pd.DataFrame(cells[occupied], columns=MEASURES, index=index[occupied])
+            frame = frame.sort_index()
+            if len(by) == 1:
+                frame.index = frame.index.get_level_values(0)
+        else:
+            frame = pd.DataFrame(cells, columns=MEASURES, index=["total"])
+        frame["count"] = frame["count"].astype("int64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame["margin"] = frame["Profit"] / frame["Sales"]
+            frame["avg_discount"] = frame["Discount"] / frame["count"]
+        return frame
+
+    def slice(self, where=None, months=None):
+        """A new cube holding only the selected cells."""
+        sub = SalesCube()
+        sub.data = self.data
+        selection = self._selection(where, months)
+        for dim, keep in selection.items():
+            sub.data = np.take(sub.data, keep, axis=DIMENSIONS.index(dim))
+        for dim in DIMENSIONS:
+            keep = selection.get(dim)
+            sub.labels[dim] = list(self.labels[dim]) if keep is None else [self.labels[dim][i] for i in keep]
+            sub._index[dim] = {label: i for i, label in enumerate(sub.labels[dim])}
+        sub.rows = int(sub.data[..., MEASURES.index("count")].sum())
+        return sub
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    def save(self, path=DEFAULT_CUBE):
+        """Write the cube to ``path`` (``.npz``) atomically."""
+        meta = {"dimensions": DIMENSIONS, "measures": MEASURES, "labels": self.labels,
+                "high_water": self.high_water, "rows": self.rows, "source": self.source}
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, data=self.data, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CUBE):
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            data = f["data"]
+        if tuple(meta["dimensions"]) != DIMENSIONS or tuple(meta["measures"]) != MEASURES:
+            raise ValueError(f"{path}: cube layout differs from this version; rebuild it")
+        cube = cls()
+        cube.data = data
+        cube.labels = {dim: list(meta["labels"][dim]) for dim in DIMENSIONS}
+        cube._index = {dim: {label: i for i, label in enumerate(cube.labels[dim])}
+                       for dim in DIMENSIONS}
+        cube.high_water = meta["high_water"]
+        cube.rows = meta["rows"]
+        cube.source = meta.get("source")
+        return cube
+
+
+def load_or_new(path=DEFAULT_CUBE):
+    return SalesCube.load(path) if os.path.exists(path) else SalesCube()
+
+
+def update_from_csv(source, cube_path=DEFAULT_CUBE, chunksize=None):
+    """Fold the rows of ``source`` not yet in the cube at ``cube_path`` into it.
+
+    Streams the export in chunks (only the cube's columns are parsed) and
+    saves the cube; returns ``(cube, rows added)``.  An export that was not
+    just appended to and has no ``Row ID`` is aggregated into a new cube.
+    """
+    from superstore_loader import CHUNK_ROWS, DEFAULT_ENCODING, read_chunks, source_hash
+
+    cube = load_or_new(cube_path)
+    size = os.path.getsize(source)
+    offset = 0
+    last = cube.source
+    if last and last["size"] <= size and source_hash(source, limit=last["size"]) == last["sha1"]:
+        # Same bytes as last time plus (maybe) appended rows
+        offset = last["size"]
+    header = pd.read_csv(source, encoding=DEFAULT_ENCODING, nrows=0).columns
+    columns = [c for c in (ROW_ID, DATE_COLUMN) + DIMENSIONS[:-1] + MEASURES[:-1] if c in header]
+    if offset == 0 and cube.rows and (ROW_ID not in columns or cube.high_water is None):
+        # The export was rewritten and there are no Row IDs to tell old rows
+        # from new ones: aggregating it on top would count every row twice
+        cube = SalesCube()
+    # Row IDs need not be sorted in the export: every chunk is compared
+    # with the mark as it was before this refresh
+    since = cube.high_water
+    added = 0
+    if offset < size:
+        for chunk in read_chunks(source, chunksize=chunksize or CHUNK_ROWS, usecols=columns,
+                                 offset=offset):
+            added += cube.add(chunk, after=since)
+    with open(source, "rb") as f:
+        f.seek(max(size - 1, 0))
+        # Resume from this offset next time only if it is a row boundary
+        complete = f.read(1) == b"\n"
+    cube.source = {"size": size, "sha1": source_hash(source)} if complete else None
+    cube.save(cube_path)
+    return cube, added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Superstore sales cube")
+    parser.add_argument("--cube", default=DEFAULT_CUBE)
+    sub = parser.add_subparsers(dest="action", required=True)
+    update = sub.add_parser("update", help="aggregate the new rows of an export")
+    update.add_argument("csv")
+    query = sub.add_parser("query", help="roll up the cube")
+    query.add_argument("--by", nargs="*", default=[], choices=DIMENSIONS)
+    query.add_argument("--where", nargs="*", default=[], metavar="DIM=LABEL")
+    query.add_argument("--months", nargs=2, metavar=("FIRST", "LAST"))
+    args = parser.parse_args(argv)
+
+    if args.action == "update":
+        cube, added = update_from_csv(args.csv, args.cube)
+        print(f"{added} new rows; cube holds {cube.rows} rows in "
+              f"{int(np.prod(cube.data.shape[:-1]))} cells", file=sys.stderr)
+        return 0
+    where = {}
+    for clause in args.where:
+        dim, _, label = clause.partition("=")
+        where.setdefault(dim, []).append(label)
+    frame = SalesCube.load(args.cube).rollup(args.by, where, args.months)
+    print(frame.to_string(float_format=lambda v: f"{v:,.2f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""
+Memory-efficient, cached loading of Superstore order exports.
+
+``pd.read_csv`` with default dtypes keeps every text column as Python
+strings and every number as 64-bit, and the EDA then re-parses dates and
+imputes column by column on top.  :func:`load_superstore` instead reads the
+CSV ``CHUNK_ROWS`` rows at a time, parsing each distinct date string once
+as it is read, and gives each chunk compact dtypes as it arrives:
+
+* low-cardinality text (Region, Category, Segment, Ship Mode, states, ids,
+  product names...) becomes ``category``;
+* integers are downcast (``Row ID`` int32, ``Quantity`` int16) and
+  ``Discount`` becomes float32; Sales and Profit stay float64 so totals keep
+  their cents;
+* columns the schema does not know are inferred from the first chunk.
+
+Each compacted chunk is appended to a Parquet file, so the raw CSV is never
+in memory as a whole.  That file is the cache: it is named after the SHA-1
+of the source CSV (plus :data:`LOADER_VERSION`), so a repeat run on the same
+export reads the columnar copy — optionally only some ``columns`` — and a new
+export is re-ingested automatically.  Caches live in ``.superstore_cache``
+next to the CSV, or in ``SUPERSTORE_CACHE_DIR``.
+
+pyarrow is needed for the cache; without it the chunks are concatenated in
+memory and nothing is cached.
+
+    from superstore_loader import load_superstore, impute_missing
+    df = load_superstore("Superstore.csv")
+"""
+
+import glob
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PATH = "Superstore.csv"
+DEFAULT_ENCODING = "latin1"
+CHUNK_ROWS = 200_000
+# Bump when the dtypes below change, so old caches are not reused
+LOADER_VERSION = 1
+CACHE_DIR_NAME = ".superstore_cache"
+
+DATE_COLUMNS = ["Order Date", "Ship Date"]
+CATEGORY_COLUMNS = [
+    "Order ID", "Ship Mode", "Customer ID", "Customer Name", "Segment", "Country",
+    "City", "State", "Postal Code", "Region", "Product ID", "Category", "Sub-Category",
+    "Product Name",
+]
+NUMERIC_DTYPES = {
+    "Row ID": "int32",
+    "Quantity": "int16",
+    "Discount": "float32",
+    "Sales": "float64",
+    "Profit": "float64",
+}
+# Unknown text columns with fewer distinct values than this share of rows
+# (in the first chunk) are stored as categories
+CATEGORY_MAX_RATIO = 0.5
+
+
+# ---------------------------
+# Dtypes
+# ---------------------------
+def infer_dtypes(chunk):
+    """Compact dtype for every column of the first chunk."""
+    dtypes = {}
+    for col in chunk.columns:
+        series = chunk[col]
+        if col in DATE_COLUMNS or pd.api.types.is_datetime64_any_dtype(series):
+            dtypes[col] = "datetime64[ns]"
+        elif col in NUMERIC_DTYPES:
+            dtypes[col] = NUMERIC_DTYPES[col]
+        elif col in CATEGORY_COLUMNS:
+            dtypes[col] = "category"
+        elif pd.api.types.is_bool_dtype(series):
+            dtypes[col] = "bool"
+        elif pd.api.types.is_integer_dtype(series) or (
+                pd.api.types.is_float_dtype(series)
+                and np.array_equal(series.dropna(), series.dropna().round())):
+            # Whole numbers (float only because of gaps); leave headroom for
+            # later chunks rather than downcasting to the tightest fit
+            fits = series.dropna().abs().max() if series.notna().any() else 0
+            dtypes[col] = "int32" if fits < 2 ** 31 - 1 else "int64"
+        elif pd.api.types.is_float_dtype(series):
+            dtypes[col] = "float64"
+        elif series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * max(len(series), 1):
+            dtypes[col] = "category"
+        else:
+            dtypes[col] = "str"
+    return dtypes
+
+
+def compact(chunk, dtypes):
+    """``chunk`` converted to ``dtypes``; integer columns with gaps become nullable."""
+    out = {}
+    for col in chunk.columns:
+        series, dtype = chunk[col], dtypes.get(col, "str")
+        if dtype == "datetime64[ns]":
+            out[col] = _parse_dates(series)
+        elif dtype == "category":
+            out[col] = series.astype("category")
+        elif dtype.startswith("int"):
+            series = pd.to_numeric(series, errors="coerce")
+            out[col] = series.astype(dtype if series.notna().all() else dtype.capitalize())
+        elif dtype.startswith("float"):
+            out[col] = pd.to_numeric(series, errors="coerce").astype(dtype)
+        else:
+            out[col] = series.astype(dtype)
+    return pd.DataFrame(out)
+
+
+def _parse_dates(series):
+    """Datetimes of a date column read as ``category``.
+
+    An order export has a few thousand distinct dates over millions of rows,
+    so only the distinct strings are parsed and the codes index into them.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    parsed = pd.to_datetime(series.cat.categories, errors="coerce", format="mixed")
+    # Code -1 (missing) picks the NaT appended at the end
+    lookup = np.append(parsed.to_numpy(), np.datetime64("NaT", "ns").astype(parsed.dtype))
+    return pd.Series(lookup[series.cat.codes.to_numpy()], index=series.index, name=series.name)
+
+
+def read_chunks(path=DEFAULT_PATH, encoding=DEFAULT_ENCODING, chunksize=CHUNK_ROWS, usecols=None,
+                offset=0):
+    """Compacted chunks of the CSV; dtypes are fixed by the first chunk.
+
+    ``usecols`` limits the parsed columns; ``offset`` starts reading at that
+    byte (the start of a row), e.g. where an earlier read of a growing export
+    ended.
+    """
+    names = list(pd.read_csv(path, encoding=encoding, nrows=0).columns)
+    header = names if usecols is None else [c for c in names if c in set(usecols)]
+    with open(path, "rb") as f:
+        position = {}
+        if offset:
+            f.seek(offset)
+            position = {"header": None, "names": names}
+        reader = pd.read_csv(
+            f, encoding=encoding, chunksize=chunksize, usecols=usecols,
+            # The reader builds the categories (and the distinct dates) directly;
+            # zip codes stay text, keeping their leading zeros
+            dtype={c: "category" for c in CATEGORY_COLUMNS + DATE_COLUMNS if c in header},
+            **position,
+        )
+        dtypes = None
+        for chunk in reader:
+            if dtypes is None:
+                dtypes = infer_dtypes(chunk)
+            yield compact(chunk, dtypes)
+
+
+def _concat(chunks):
+    """Concatenate chunks, unioning categories so they stay categorical."""
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals([c[col] for c in chunks]).categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+# ---------------------------
+# Parquet cache
+# ---------------------------
+def source_hash(path, chunk_size=1 << 20, limit=None):
+    """SHA-1 of the file, or of its first ``limit`` bytes."""
+    h = hashlib.sha1()
+    remaining = limit if limit is not None else float("inf")
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(int(min(chunk_size, remaining)))
+            if not block:
+                break
+            h.update(block)
+            remaining -= len(block)
+    return h.hexdigest()
+
+
+def cache_dir_for(path):
+    return os.environ.get("SUPERSTORE_CACHE_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+
+
+def cache_path(path, digest=None, cache_dir=None):
+    """Parquet cache of ``path``: ``<stem>-<sha1>-v<LOADER_VERSION>.parquet``."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = digest or source_hash(path)
+    return os.path.join(cache_dir or cache_dir_for(path),
+                        f"{stem}-{digest[:16]}-v{LOADER_VERSION}.parquet")
+
+
+def _arrow_schema(chunk):
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    # Later chunks may bring more categories than the first one's index type holds
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+def write_cache(chunks, target):
+    """Stream ``chunks`` into a Parquet file at ``target`` (atomically); returns rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    writer, rows = None, 0
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = _arrow_schema(chunk)
+                writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+        if writer is None:
+            raise ValueError("source has no rows")
+        writer.close()
+        writer = None
+        os.replace(tmp, target)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # Caches of earlier versions of this export are dead now
+    stem = os.path.basename(target).rsplit("-", 2)[0]
+    for old in glob.glob(os.path.join(os.path.dirname(target), glob.escape(stem) + "-*-v*.parquet")):
+        if old != target:
+            os.remove(old)
+    return rows
+
+
+def read_cache(target, columns=None):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(target, columns=columns)
+    # Frees each Arrow column as soon as it is converted
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def _have_pyarrow():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def load_superstore(path=DEFAULT_PATH, encoding=DEFAULT_ENCODING, columns=None,
+                    chunksize=CHUNK_ROWS, use_cache=True, cache_dir=None, verbose=True):
+    """The Superstore export at ``path`` as a compactly typed DataFrame.
+
+    Served from the Parquet cache when the CSV is unchanged; otherwise the
+    CSV is streamed into a new cache first.  ``columns`` limits what is read
+    back from the cache.
+    """
+    t0 = time.perf_counter()
+    if not (use_cache and _have_pyarrow()):
+        df = _concat(read_chunks(path, encoding, chunksize))
+        source = "csv"
+    else:
+        target = cache_path(path, cache_dir=cache_dir)
+        source = "cache"
+        if not os.path.exists(target):
+            write_cache(read_chunks(path, encoding, chunksize), target)
+            source = "csv -> cache"
+        df = read_cache(target, columns)
+    if columns is not None:
+        df = df[list(columns)]
+    if verbose:
+        print(f"[superstore] {len(df):,} rows from {source} in {time.perf_counter() - t0:.1f}s, "
+              f"{memory_mb(df):.1f} MB", file=sys.stderr)
+    return df
+
+
+# ---------------------------
+# Missing data
+# ---------------------------
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def missing_summary(df):
+    """Missing values per column, only columns that have any."""
+    missing = df.isna().sum()
+    return missing[missing > 0]
+
+
+def impute_missing(df):
+    """A copy with numeric gaps filled by the median and the rest by the mode.
+
+    One ``fillna`` with a per-column mapping instead of column-by-column
+    in-place fills (which copy-on-write pandas silently ignores).
+    """
+    fill = {}
+    for col in missing_summary(df).index:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            value = series.median()
+            if pd.api.types.is_integer_dtype(series):
+                value = round(value)
+        else:
+            mode = series.mode(dropna=True)
+            if mode.empty:
+                continue
+            value = mode.iloc[0]
+        fill[col] = value
+    return df.fillna(fill) if fill else df
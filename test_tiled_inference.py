@@ -0,0 +1,41 @@
+import numpy as np
+
+from detections import Detections
+from tiled_inference import nms, touches_seam
+
+
+def make(boxes, conf, cls=None):
+    return Detections(np.array(boxes, np.float32), np.array(conf, np.float32),
+                      np.zeros(len(conf), np.int32) if cls is None else np.array(cls, np.int32))
+
+
+def test_low_confidence_container_does_not_widen_kept_box():
+    dets = make([[100, 100, 150, 150], [0, 0, 1000, 1000]], [0.9, 0.02])
+    for cut in (None, [False, False], [True, True]):
+        kept = nms(dets, cut=cut).filter(0.25)
+        assert kept.xyxy.tolist() == [[100, 100, 150, 150]]
+        assert kept.conf.tolist() == [np.float32(0.9)]
+
+
+def test_nested_objects_are_suppressed_not_merged():
+    dets = make([[0, 0, 400, 400], [50, 50, 100, 100]], [0.9, 0.8])
+    kept = nms(dets)
+    assert kept.xyxy.tolist() == [[0, 0, 400, 400]]
+
+
+def test_box_cut_at_seam_merges_with_whole_box():
+    # Tile (0, 0, 640, 640) of a 2000 x 2000 image cuts the object at x = 640
+    window = (0, 0, 640, 640)
+    cut_box = [600, 100, 640, 160]
+    whole_box = [590, 98, 700, 160]
+    cut = np.concatenate([touches_seam(np.array([cut_box], np.float32), window, 2000, 2000),
+                          [False]])
+    assert cut.tolist() == [True, False]
+    kept = nms(make([cut_box, whole_box], [0.9, 0.7]), cut=cut)
+    assert kept.xyxy.tolist() == [[590, 98, 700, 160]]
+    assert kept.conf.tolist() == [np.float32(0.9)]
+
+
+def test_image_border_is_not_a_seam():
+    box = np.array([[0, 0, 50, 50]], np.float32)
+    assert not touches_seam(box, (0, 0, 640, 640), 2000, 2000).any()
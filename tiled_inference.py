@@ -0,0 +1,165 @@
+"""
+Sliced (tiled) inference for high-resolution images.
+
+A 12MP photo squeezed into a 640px model input loses far-away plates, helmets
+at the back of a site and single grapes.  Above ``TILING_MIN_MP`` megapixels
+(default 4) the image is cut into overlapping ``tile``-sized crops that go
+through the model at native resolution in mini-batches, optionally spread
+over a thread pool, plus one downscaled full-frame pass for objects larger
+than a tile.  Boxes are shifted back to image coordinates and merged with
+class-aware NMS, which also joins a box cut off at a tile seam with the
+whole box from the neighbouring tile.  Smaller images keep the single-pass
+path.
+
+ultralytics predictors are not thread-safe, so with ``TILING_THREADS`` > 1
+the batches run on the detector's long-lived replica pool (one model copy
+per thread, loaded once and counted against the registry's RAM budget);
+the default of 1 runs the batches on the caller's model.
+"""
+
+import os
+
+import numpy as np
+
+from batching import chunked
+from detections import Detections, iou_matrix, ios_matrix
+
+DEFAULT_TILE = 640
+DEFAULT_OVERLAP = 0.2
+DEFAULT_MIN_MP = 4.0
+# Intersection over the smaller box above which two boxes are one object
+DEFAULT_IOS = 0.8
+# Boxes below this confidence are suppressed but never widen a kept box
+DEFAULT_MERGE_CONF = 0.25
+# Pixels from a tile seam within which a box edge counts as cut off
+SEAM_TOLERANCE = 2
+
+
+def min_megapixels():
+    return float(os.environ.get("TILING_MIN_MP", DEFAULT_MIN_MP))
+
+
+def should_tile(img, min_mp=None):
+    """True when ``img`` is large enough for sliced inference to pay off."""
+    if min_mp is None:
+        min_mp = min_megapixels()
+    h, w = img.shape[:2]
+    return min_mp > 0 and h * w >= min_mp * 1_000_000
+
+
+def tile_grid(height, width, tile=DEFAULT_TILE, overlap=DEFAULT_OVERLAP):
+    """``(x1, y1, x2, y2)`` windows covering the image with the given overlap.
+
+    The last row/column is shifted back so every tile is full size (when the
+    image is larger than a tile), which keeps tile batches the same shape.
+    """
+    step = max(1, int(tile * (1 - overlap)))
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        points = list(range(0, size - tile, step))
+        points.append(size - tile)
+        return points
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def touches_seam(xyxy, window, height, width, tol=SEAM_TOLERANCE):
+    """Which boxes of a tile (in image coordinates) reach one of its inner edges."""
+    x1, y1, x2, y2 = window
+    return (((xyxy[:, 0] <= x1 + tol) & (x1 > 0))
+            | ((xyxy[:, 1] <= y1 + tol) & (y1 > 0))
+            | ((xyxy[:, 2] >= x2 - tol) & (x2 < width))
+            | ((xyxy[:, 3] >= y2 - tol) & (y2 < height)))
+
+
+def nms(dets, iou_threshold=0.5, ios_threshold=DEFAULT_IOS, cut=None,
+        merge_conf=DEFAULT_MERGE_CONF):
+    """Class-aware greedy non-maximum suppression, returns the kept detections.
+
+    A box cut off at a tile seam overlaps the whole box from the neighbouring
+    tile with a low IoU but lies (almost) inside it.  Boxes whose
+    intersection covers ``ios_threshold`` of the smaller one are therefore
+    suppressed besides the usual IoU rule, and when either box is flagged in
+    ``cut`` (see :func:`touches_seam`) and the partner scores at least
+    ``merge_conf``, the kept box grows to their union.  Without ``cut``
+    nothing is merged.
+    """
+    if len(dets) <= 1:
+        return dets
+    order = np.argsort(-dets.conf)
+    # Offsetting boxes by class keeps different classes from suppressing each other
+    offset = dets.cls[:, None].astype(np.float32) * (dets.xyxy.max() + 1)
+    boxes = (dets.xyxy + offset)[order]
+    raw = dets.xyxy[order]
+    conf = dets.conf[order]
+    cut = np.zeros(len(order), bool) if cut is None else np.asarray(cut, bool)[order]
+    keep, merged = [], []
+    remaining = np.arange(len(order))
+    while len(remaining):
+        best, rest = remaining[0], remaining[1:]
+        keep.append(order[best])
+        box = raw[best]
+        if len(rest):
+            pair = boxes[best:best + 1], boxes[rest]
+            part = ios_matrix(*pair)[0] >= ios_threshold
+            join = part & (cut[rest] | cut[best]) & (conf[rest] >= merge_conf)
+            if join.any():
+                group = raw[rest[join]]
+                box = np.concatenate([np.minimum(box[:2], group[:, :2].min(axis=0)),
+                                      np.maximum(box[2:], group[:, 2:].max(axis=0))])
+            rest = rest[(iou_matrix(*pair)[0] < iou_threshold) & ~part]
+        merged.append(box)
+        remaining = rest
+    kept = dets.select(np.array(keep))
+    kept.xyxy = np.array(merged, dtype=kept.xyxy.dtype)
+    return kept
+
+
+def detect_tiled(detector, img, conf=0.25, tile=DEFAULT_TILE, overlap=DEFAULT_OVERLAP,
+                 batch_size=8, threads=1, full_frame=True, iou_threshold=0.5):
+    """Sliced detection over ``img``; returns merged :class:`Detections`."""
+    h, w = img.shape[:2]
+    windows = tile_grid(h, w, tile, overlap)
+
+    def run_batch(model, batch):
+        crops = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in batch]
+        results = model(crops, conf=conf, imgsz=tile, verbose=False)
+        parts = []
+        for window, result in zip(batch, results):
+            x1, y1 = window[:2]
+            dets = Detections.from_result(result)
+            dets.xyxy += np.array([x1, y1, x1, y1], np.float32)
+            parts.append((dets, touches_seam(dets.xyxy, window, h, w)))
+        return parts
+
+    batches = list(chunked(windows, batch_size))
+    if threads > 1 and len(batches) > 1 and hasattr(detector, "replica_pool"):
+        pool = detector.replica_pool(threads)
+        tile_parts = [p for parts in pool.map(run_batch, batches) for p in parts]
+    else:
+        tile_parts = [p for batch in batches for p in run_batch(detector, batch)]
+
+    if full_frame:
+        # Objects bigger than a tile are only whole in the downscaled view
+        whole = Detections.from_result(detector(img, conf=conf, imgsz=tile, verbose=False)[0])
+        tile_parts.append((whole, np.zeros(len(whole), bool)))
+
+    parts, cuts = zip(*tile_parts)
+    return nms(Detections.concat(list(parts)), iou_threshold, cut=np.concatenate(cuts))
+
+
+def detect_auto(detector, img, conf=0.25, imgsz=None, **tile_kwargs):
+    """Tiled detection above the resolution threshold, one pass below it.
+
+    A remote detector always gets the whole image; the service tiles it.
+    """
+    if should_tile(img) and not getattr(detector, "remote", False):
+        tile_kwargs.setdefault("threads", int(os.environ.get("TILING_THREADS", 1)))
+        return detect_tiled(detector, img, conf=conf, tile=imgsz or DEFAULT_TILE, **tile_kwargs)
+    kwargs = {"conf": conf}
+    if imgsz is not None:
+        kwargs["imgsz"] = imgsz
+    return Detections.from_result(detector(img, **kwargs)[0])
@@ -0,0 +1,190 @@
+"""
+Background model loading and warm-up, so the page renders first.
+
+Importing ultralytics/torch and loading weights takes seconds, and the first
+forward pass pays for allocator and kernel warm-up on top.  Instead of doing
+all of that before the first widget appears, an app calls
+:func:`start_warmup` at the top of the script: one daemon thread imports
+ultralytics, loads the models through the registry and runs a dummy forward
+pass at the configured imgsz (``WARMUP_IMGSZ``, else the checkpoint's own,
+read with :mod:`checkpoint_meta`).  The page renders straight away with a
+readiness indicator (:func:`show_readiness`), and the detect path calls
+:func:`wait_ready`, which only blocks if warm-up is still running.
+
+Time to interactive page and time to first detection are measured from
+process start and shown in the indicator / logged to stderr.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+_IMPORTED = time.time()
+DEFAULT_IMGSZ = 640
+
+_states = {}
+_lock = threading.Lock()
+_pending = queue.Queue()
+_worker = None
+_milestones = {}
+
+
+def process_start_time():
+    """Wall-clock start of this process (Linux), else when this module loaded."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _IMPORTED
+
+
+class ModelState:
+    def __init__(self, name, imgsz):
+        self.name = name
+        self.imgsz = imgsz
+        self.status = "queued"
+        self.error = None
+        self.load_s = None
+        self.warm_s = None
+        self.done = threading.Event()
+
+
+def warmup_imgsz(name):
+    """``WARMUP_IMGSZ``, else the imgsz the checkpoint was trained at."""
+    if os.environ.get("WARMUP_IMGSZ"):
+        return int(os.environ["WARMUP_IMGSZ"])
+    from checkpoint_meta import read_metadata
+    from detector_registry import DETECTORS, resolve_weights
+
+    try:
+        imgsz = read_metadata(resolve_weights(DETECTORS[name]))["imgsz"]
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_IMGSZ
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz)
+    return int(imgsz or DEFAULT_IMGSZ)
+
+
+def _run():
+    import numpy as np
+
+    from detector_registry import load_detector
+
+    while True:
+        state = _pending.get()
+        try:
+            state.status = "loading"
+            t0 = time.perf_counter()
+            detector = load_detector(state.name)
+            state.load_s = time.perf_counter() - t0
+
+            state.status = "warming up"
+            imgsz = state.imgsz or warmup_imgsz(state.name)
+            t0 = time.perf_counter()
+            detector(np.zeros((imgsz, imgsz, 3), np.uint8), imgsz=imgsz, verbose=False)
+            state.warm_s = time.perf_counter() - t0
+            state.status = "ready"
+        except Exception as e:
+            state.error = e
+            state.status = "failed"
+        finally:
+            state.done.set()
+
+
+def start_warmup(names, imgsz=None):
+    """Queue ``names`` for background loading + warm-up (once per process)."""
+    global _worker
+    with _lock:
+        for name in names:
+            # A failed model is retried, e.g. once its weights are in place
+            if name not in _states or _states[name].status == "failed":
+                _states[name] = ModelState(name, imgsz)
+                _pending.put(_states[name])
+        if _worker is None:
+            _worker = threading.Thread(target=_run, daemon=True, name="model-warmup")
+            _worker.start()
+
+
+def is_ready(name):
+    state = _states.get(name)
+    return state is not None and state.status == "ready"
+
+
+def wait_ready(name, timeout=None):
+    """The loaded detector, waiting for its warm-up if it is still running.
+
+    Re-raises the warm-up error (e.g. ``FileNotFoundError``) if it failed.
+    """
+    from detector_registry import load_detector
+
+    start_warmup([name])
+    state = _states[name]
+    if not state.done.wait(timeout):
+        raise TimeoutError(f"model '{name}' is still {state.status}")
+    if state.error is not None:
+        raise state.error
+    # A registry hit; reloads if the weights changed or were evicted since
+    return load_detector(name)
+
+
+def mark(milestone):
+    """Record the first time ``milestone`` is reached, in seconds since process start."""
+    with _lock:
+        if milestone in _milestones:
+            return
+        _milestones[milestone] = time.time() - process_start_time()
+    print(f"[startup] {milestone}: {_milestones[milestone]:.2f}s after process start",
+          file=sys.stderr)
+
+
+def startup_report():
+    """Milestones plus per-model load / warm-up seconds."""
+    report = dict(_milestones)
+    for name, state in _states.items():
+        report[f"{name}.status"] = state.status
+        if state.load_s is not None:
+            report[f"{name}.load_s"] = round(state.load_s, 3)
+        if state.warm_s is not None:
+            report[f"{name}.warm_s"] = round(state.warm_s, 3)
+    return report
+
+
+# ---------------------------
+# Streamlit indicator
+# ---------------------------
+def show_readiness(names):
+    """Sidebar status of the models; polls until all of them have finished."""
+    import streamlit as st
+
+    polling = not all(_states[n].done.is_set() for n in names if n in _states)
+
+    @st.fragment(run_every=0.5 if polling else None)
+    def indicator():
+        states = [_states[n] for n in names if n in _states]
+        if polling and all(s.done.is_set() for s in states):
+            # Everything finished: one full rerun turns polling off
+            st.rerun()
+        for s in states:
+            if s.status == "ready":
+                st.success(f"🟢 {s.name} model ready · load {s.load_s:.1f}s · "
+                           f"warm-up {s.warm_s:.1f}s")
+            elif s.status == "failed":
+                st.error(f"🔴 {s.name} model failed: {s.error}")
+            else:
+                st.info(f"🟡 {s.name} model {s.status}…")
+        parts = []
+        if "interactive" in _milestones:
+            parts.append(f"interactive after {_milestones['interactive']:.1f}s")
+        if "first_detection" in _milestones:
+            parts.append(f"first detection after {_milestones['first_detection']:.1f}s")
+        if parts:
+            st.caption("Startup: " + " · ".join(parts))
+
+    with st.sidebar:
+        indicator()